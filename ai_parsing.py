@@ -0,0 +1,231 @@
+import json
+import re
+import time
+
+import metrics
+
+# Generation config asking Gemini to answer with bare JSON instead of prose
+JSON_GENERATION_CONFIG = {'response_mime_type': 'application/json'}
+
+# Expected shape of the ai_analysis dict stored with every note
+LIST_FIELDS = ['key_topics', 'important_equations', 'highlights', 'test_questions', 'related_links']
+POINT_FIELDS = ['text', 'explanation', 'type']
+
+_decoder = json.JSONDecoder()
+
+_PYTHON_LITERAL = re.compile(r'(True|False|None)\b')
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+class AIResponseParseError(ValueError):
+    """Raised when no JSON object can be recovered from a model response"""
+
+
+def _strip_code_fences(text):
+    """Remove ```json ... ``` markdown fences around the payload"""
+    fence = re.search(r'```(?:json)?\s*(.*?)```', text, re.DOTALL)
+    if fence and '{' in fence.group(1):
+        return fence.group(1)
+    return text
+
+
+def _repair_json(text):
+    """Fix the defects Gemini most often produces in otherwise valid JSON
+
+    Substitutions only apply outside strings, so document text such as
+    "the “chain” rule" or "True or False" is kept as written.
+    """
+    repaired = []
+    stack = []
+    closer = None  # quote that ends the current string; None outside strings
+    escaped = False
+    pos = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        pos += 1
+        if closer:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == closer or char == '"':
+                closer = None
+                char = '"'
+            repaired.append(char)
+        elif char in '"“':
+            # Curly quotes used as string delimiters
+            closer = '"' if char == '"' else '”'
+            repaired.append('"')
+        elif char == ',':
+            # Trailing commas before a closing bracket or the end of a truncated response
+            following = pos
+            while following < length and text[following].isspace():
+                following += 1
+            if following < length and text[following] not in '}]':
+                repaired.append(char)
+        elif char in 'TFN' and not (repaired and (repaired[-1].isalnum() or repaired[-1] == '_')):
+            # Python style literals
+            literal = _PYTHON_LITERAL.match(text, pos - 1)
+            if literal:
+                repaired.append(_PYTHON_LITERALS[literal.group(1)])
+                pos = literal.end()
+            else:
+                repaired.append(char)
+        else:
+            if char in '{[':
+                stack.append('}' if char == '{' else ']')
+            elif char in '}]' and stack:
+                stack.pop()
+            repaired.append(char)
+
+    # Close strings and brackets left open when the response was truncated
+    if closer:
+        repaired.append('"')
+    repaired.extend(reversed(stack))
+    return ''.join(repaired)
+
+
+def _decode_first_object(text):
+    """Decode the first JSON object in text, ignoring anything after it"""
+    start = text.find('{')
+    if start == -1:
+        raise AIResponseParseError('No JSON object found in response')
+    # A top-level array is not an analysis, even if its first item is an object
+    bracket = text.find('[')
+    if -1 < bracket < start and not text[bracket + 1:start].strip():
+        raise AIResponseParseError('Response JSON is not an object')
+    obj, _ = _decoder.raw_decode(text, start)
+    if not isinstance(obj, dict):
+        raise AIResponseParseError('Response JSON is not an object')
+    return obj
+
+
+def _as_text(value):
+    """Coerce a schema value to a string"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+def _validate_field(field, value):
+    """Coerce one top-level ai_analysis field to its schema type"""
+    if field == 'subject_match':
+        if isinstance(value, str):
+            value = value.strip().lower() not in ('false', 'no', '0')
+        return bool(value)
+
+    if field in LIST_FIELDS:
+        if value is None:
+            value = []
+        elif not isinstance(value, list):
+            value = [value]
+        return [_as_text(item) for item in value if item not in (None, '')]
+
+    if field == 'important_points':
+        if not isinstance(value, list):
+            value = [value]
+        cleaned_points = []
+        for point in value:
+            if isinstance(point, str):
+                point = {'text': point}
+            if not isinstance(point, dict):
+                continue
+            cleaned_points.append({name: _as_text(point.get(name, '')) for name in POINT_FIELDS})
+        return cleaned_points
+
+    if field == 'index_relevance':
+        return _as_text(value)
+
+    return value
+
+
+def validate_analysis(data):
+    """Coerce parsed data into the ai_analysis schema"""
+    analysis = dict(data)
+    analysis['subject_match'] = _validate_field('subject_match', analysis.get('subject_match', True))
+    for field in LIST_FIELDS + ['important_points', 'index_relevance']:
+        analysis[field] = _validate_field(field, analysis.get(field))
+    return analysis
+
+
+def validate_fields(fields):
+    """Coerce the fields of a partial analysis, leaving missing fields out"""
+    return {field: _validate_field(field, value) for field, value in fields.items()}
+
+
+def _record(outcome, elapsed_ms):
+    metrics.inc('edunote_ai_parse_results_total', outcome=outcome)
+    metrics.observe('edunote_ai_parse_seconds', elapsed_ms / 1000)
+
+
+def parse_ai_response(response_text):
+    """Parse and validate a Gemini response into an ai_analysis dict
+
+    Raises AIResponseParseError if nothing usable can be recovered.
+    """
+    started = time.perf_counter()
+    text = _strip_code_fences((response_text or '').strip())
+    outcome = 'success'
+
+    try:
+        try:
+            data = _decode_first_object(text)
+        except json.JSONDecodeError:
+            outcome = 'repaired'
+            data = _decode_first_object(_repair_json(text))
+        analysis = validate_analysis(data)
+    except (json.JSONDecodeError, AIResponseParseError) as e:
+        _record('failed', (time.perf_counter() - started) * 1000)
+        if isinstance(e, AIResponseParseError):
+            raise
+        raise AIResponseParseError(str(e)) from e
+
+    _record(outcome, (time.perf_counter() - started) * 1000)
+    return analysis
+
+
+def parse_partial_response(response_text, pos=0):
+    """Return (fields, pos) for the top-level fields completed in a partially streamed response
+
+    Fields are decoded one at a time with raw_decode; decoding stops at the
+    first value that is still being generated. Passing the returned pos back
+    in with the grown response resumes there, so only new fields are
+    decoded and returned.
+    """
+    text = response_text or ''
+    if not pos:
+        # Skips a leading ```json fence as well as any preamble
+        start = text.find('{')
+        if start == -1:
+            return {}, 0
+        pos = start + 1
+
+    fields = {}
+    length = len(text)
+    while True:
+        field_start = pos
+        while pos < length and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= length or text[pos] != '"':
+            break
+        try:
+            key, pos = _decoder.raw_decode(text, pos)
+            while pos < length and text[pos] in ' \t\r\n':
+                pos += 1
+            if pos >= length or text[pos] != ':':
+                break
+            pos += 1
+            while pos < length and text[pos] in ' \t\r\n':
+                pos += 1
+            value, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        # A number at the very end of the buffer may still be growing
+        if pos >= length and not isinstance(value, (dict, list, str)):
+            break
+        fields[key] = value
+
+    return fields, field_start
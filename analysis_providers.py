@@ -0,0 +1,553 @@
+import logging
+import math
+from abc import ABC, abstractmethod
+import os
+import re
+import threading
+import time
+
+import metrics
+from metrics import stage_timer
+from ai_parsing import JSON_GENERATION_CONFIG, AIResponseParseError, parse_ai_response, parse_partial_response
+
+logger = logging.getLogger('edunote')
+
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+
+
+class AnalysisProvider(ABC):
+    """Interface for services that produce the ai_analysis dict for a note
+
+    Subclasses must implement analyze_file and analyze_text. Providers raise
+    on failure; the caller turns errors into the stub analysis stored with
+    the note. AIResponseParseError carries the raw response in its
+    response_text attribute.
+    """
+    name = 'base'
+
+    def is_available(self):
+        """Whether the provider can be used in this process"""
+        return True
+
+    @abstractmethod
+    def analyze_file(self, filepath, subject, class_name, index_key=None, content=None):
+        """Analyze an uploaded file and return an ai_analysis dict
+
+        content is the text already extracted from the file, if the caller
+        has it; providers that work on text use it instead of re-reading the file.
+        """
+
+    @abstractmethod
+    def analyze_text(self, content, subject, class_name, index_key=None):
+        """Analyze note text and return an ai_analysis dict"""
+
+    def stream_file(self, filepath, subject, class_name, index_key=None, content=None):
+        """Analyze a file, yielding ('stage', name), ('partial', fields) and finally ('done', analysis)
+
+        Providers that cannot stream return the whole analysis at once.
+        """
+        yield 'done', self.analyze_file(filepath, subject, class_name, index_key, content)
+
+    def reset(self):
+        """Drop per-process state, e.g. network clients inherited across fork()"""
+
+
+def build_file_analysis_prompt(subject, class_name, index_key=None):
+    """Build the Gemini prompt for analyzing an uploaded file"""
+    index_context = ""
+    if index_key and index_key != "general":
+        index_context = f" This note appears to be related to textbook section: {index_key}."
+
+    prompt = f"""
+    Analyze this uploaded file for a {subject} class ({class_name}) and provide:{index_context}
+    1. Subject classification (confirm if it matches {subject})
+    2. Key topics/concepts covered
+    3. Important equations or formulas (if any)
+    4. FIVE most important points or facts with specific explanations
+    5. Potential test questions
+    6. Related concepts or links to explore
+    7. Textbook index/chapter relevance
+
+    For the important points, provide the exact text from the document and a detailed explanation.
+
+    Respond in JSON format with the following structure:
+    {{
+        "subject_match": true/false,
+        "key_topics": ["topic1", "topic2"],
+        "important_equations": ["equation1", "equation2"],
+        "highlights": ["text to highlight", "another highlight"],
+        "important_points": [
+            {{
+                "text": "exact text from document",
+                "explanation": "detailed explanation of why this is important",
+                "type": "concept/formula/definition/example"
+            }}
+        ],
+        "test_questions": ["question1", "question2"],
+        "related_links": ["concept1", "concept2"],
+        "index_relevance": "description of how this relates to textbook structure"
+    }}
+    """
+    return prompt
+
+
+def build_note_analysis_prompt(content, subject, class_name, index_key=None):
+    """Build the Gemini prompt for analyzing note text"""
+    index_context = ""
+    if index_key and index_key != "general":
+        index_context = f" This note appears to be related to textbook section: {index_key}."
+
+    prompt = f"""
+    Analyze this note for a {subject} class ({class_name}) and provide:{index_context}
+    1. Subject classification (confirm if it matches {subject})
+    2. Key topics/concepts covered
+    3. Important equations or formulas (if any)
+    4. FIVE most important points or facts with specific explanations
+    5. Potential test questions
+    6. Related concepts or links to explore
+    7. Textbook index/chapter relevance
+
+    For the important points, provide the exact text from the note and a detailed explanation.
+
+    Note content:
+    {content[:2000]}  # Limit content to avoid token limits
+
+    Respond in JSON format with the following structure:
+    {{
+        "subject_match": true/false,
+        "key_topics": ["topic1", "topic2"],
+        "important_equations": ["equation1", "equation2"],
+        "highlights": ["text to highlight", "another highlight"],
+        "important_points": [
+            {{
+                "text": "exact text from document",
+                "explanation": "detailed explanation of why this is important",
+                "type": "concept/formula/definition/example"
+            }}
+        ],
+        "test_questions": ["question1", "question2"],
+        "related_links": ["concept1", "concept2"],
+        "index_relevance": "description of how this relates to textbook structure"
+    }}
+    """
+    return prompt
+
+
+class GeminiProvider(AnalysisProvider):
+    """Analysis through the Gemini API
+
+    google.generativeai is imported and the model created on first use in
+    each process, so importing the app stays cheap and a preloading parent
+    never shares a gRPC channel with its forked workers.
+    """
+    name = 'gemini'
+
+    def __init__(self, model_name=GEMINI_MODEL_NAME):
+        self.model_name = model_name
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        # You'll need to set your API key as an environment variable: GOOGLE_API_KEY
+        return bool(os.getenv('GOOGLE_API_KEY'))
+
+    def reset(self):
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+                    self._genai = genai
+        return self._genai
+
+    @property
+    def model(self):
+        if self._model is None:
+            genai = self.genai
+            with self._lock:
+                if self._model is None:
+                    self._model = genai.GenerativeModel(self.model_name)
+                    logger.info("gemini model configured model=%s pid=%d", self.model_name, os.getpid())
+        return self._model
+
+    def _upload(self, filepath):
+        with stage_timer('ai_upload'):
+            uploaded_file = self.genai.upload_file(filepath)
+        metrics.inc('edunote_gemini_upload_bytes_total', os.path.getsize(filepath))
+        logger.debug("gemini file uploaded name=%s model=%s", uploaded_file.name, self.model_name)
+        return uploaded_file
+
+    def _delete(self, uploaded_file):
+        try:
+            self.genai.delete_file(uploaded_file.name)
+        except Exception:
+            logger.warning("could not delete gemini file name=%s (may auto-expire)", uploaded_file.name)
+
+    def _parse(self, response_text):
+        logger.debug("gemini response preview=%r", response_text[:200])
+        try:
+            # Decode and validate the JSON response against the ai_analysis schema
+            with stage_timer('parse'):
+                return parse_ai_response(response_text)
+        except AIResponseParseError as e:
+            e.response_text = response_text
+            raise
+
+    def analyze_file(self, filepath, subject, class_name, index_key=None, content=None):
+        # Gemini reads the file itself, layout and images included
+        prompt = build_file_analysis_prompt(subject, class_name, index_key)
+        uploaded_file = self._upload(filepath)
+
+        # Generate content using the uploaded file
+        try:
+            with stage_timer('generate'):
+                response = self.model.generate_content([uploaded_file, prompt], generation_config=JSON_GENERATION_CONFIG)
+        finally:
+            self._delete(uploaded_file)
+        record_gemini_usage(response)
+        logger.info("gemini response received chars=%d", len(response.text))
+
+        return self._parse(response.text.strip())
+
+    def analyze_text(self, content, subject, class_name, index_key=None):
+        prompt = build_note_analysis_prompt(content, subject, class_name, index_key)
+        with stage_timer('generate'):
+            response = self.model.generate_content(prompt, generation_config=JSON_GENERATION_CONFIG)
+        record_gemini_usage(response)
+        logger.info("gemini response received chars=%d model=%s", len(response.text), self.model_name)
+
+        return self._parse(response.text.strip())
+
+    def stream_file(self, filepath, subject, class_name, index_key=None, content=None):
+        prompt = build_file_analysis_prompt(subject, class_name, index_key)
+        uploaded_file = self._upload(filepath)
+        yield 'stage', 'analyzing'
+
+        response_text = ''
+        parsed_to = 0
+        try:
+            # Includes the time the caller takes to relay each partial, which is small
+            with stage_timer('generate'):
+                response = self.model.generate_content([uploaded_file, prompt], generation_config=JSON_GENERATION_CONFIG, stream=True)
+                for chunk in response:
+                    try:
+                        response_text += chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata only)
+                        continue
+
+                    # Relay each field as soon as its value is complete
+                    new_fields, parsed_to = parse_partial_response(response_text, parsed_to)
+                    if new_fields:
+                        yield 'partial', new_fields
+        finally:
+            self._delete(uploaded_file)
+        # A consumed stream carries the usage metadata and text of the whole response
+        record_gemini_usage(response)
+        logger.info("gemini response received chars=%d model=%s", len(response_text), self.model_name)
+
+        yield 'done', self._parse(response_text)
+
+
+def record_gemini_usage(response):
+    """Record token and byte counts of a Gemini response"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        metrics.inc('edunote_gemini_tokens_total', getattr(usage, 'prompt_token_count', 0) or 0, kind='prompt')
+        metrics.inc('edunote_gemini_tokens_total', getattr(usage, 'candidates_token_count', 0) or 0, kind='candidates')
+    try:
+        metrics.inc('edunote_gemini_response_bytes_total', len(response.text.encode('utf-8')))
+    except ValueError:
+        # Responses without text parts (e.g. blocked by safety filters)
+        pass
+
+
+STOPWORDS = set('''
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc few for from further
+had has have having he her here hers him his how however i if in into is it its itself just let like
+may me might more most much must my no nor not now of off often on once one only or other our ours out
+over own per same she should so some such than that the their theirs them then there these they this
+those through thus to too two under until up upon us use used uses using very via was we well were what
+when where whether which while who whom why will with within without would yes yet you your
+become becomes called common example get gives given make makes made need needed set sometimes
+'''.split())
+
+# Stopwords allowed inside a phrase, e.g. "integration by parts"
+PHRASE_CONNECTORS = {'of', 'by'}
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+WORD_PATTERN = re.compile(r"[a-zA-Z][a-zA-Z\-']+")
+
+# Signals that a line is an equation rather than prose
+MATH_SYMBOLS = re.compile(r'[∫∬∑∏√∂∇πθλμσΔ≤≥≠≈±×÷→∞]')
+MATH_COMMANDS = re.compile(r'\\(frac|int|sum|sqrt|lim|partial|cdot|times|infty|alpha|beta|theta|pi)\b')
+MATH_NOTATION = re.compile(r'\b[a-zA-Z]\^\{?[\w\-]+|\bd/d[a-z]\b|\b[a-zA-Z]\([a-z, ]+\)|\b[a-z]_\{?\w+')
+ASSIGNMENT = re.compile(r'[\w)\]}]\s*(=|<=|>=|<|>)\s*[\w(\\\-]')
+DEFINITION = re.compile(r'\b(is defined as|is called|refers to|means|is the|are the)\b', re.IGNORECASE)
+
+MAX_TOPICS = 6
+MAX_WORD_LENGTH = 20
+MAX_POINTS = 5
+MAX_EQUATIONS = 5
+
+# A few new notes barely move the IDF, so the class corpus is re-read at most this often
+CORPUS_REFRESH_SECONDS = 300
+
+
+def extract_text(filepath):
+    """Read the text of an uploaded note (.txt/.md, .pdf or .docx), or '' if it has none"""
+    extension = os.path.splitext(filepath)[1].lower()
+    try:
+        if extension == '.pdf':
+            from PyPDF2 import PdfReader
+            return '\n'.join(page.extract_text() or '' for page in PdfReader(filepath).pages)
+        if extension == '.docx':
+            import docx
+            return '\n'.join(paragraph.text for paragraph in docx.Document(filepath).paragraphs)
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return f.read()
+    except ImportError:
+        logger.warning("cannot read %s files without their optional parser installed", extension)
+    except UnicodeDecodeError:
+        # Images and other binary uploads have no text layer
+        logger.debug("no text in binary file %s", os.path.basename(filepath))
+    except Exception as e:
+        logger.warning("could not extract text from %s error=%s", os.path.basename(filepath), e)
+    return ''
+
+
+def is_content_word(word):
+    # Overlong or vowel-less tokens are run-together words from PDF text layers, not topics
+    return (2 < len(word) <= MAX_WORD_LENGTH and word not in STOPWORDS
+            and any(vowel in word for vowel in 'aeiouy'))
+
+
+def is_readable(text):
+    """Whether text reads as prose, rather than a scanned page's run-together OCR layer"""
+    words = text.split()
+    if not words:
+        return False
+    run_together = sum(len(word) for word in words if len(word) > MAX_WORD_LENGTH)
+    return run_together <= sum(len(word) for word in words) / 2
+
+
+def terms(text):
+    """Content words plus the phrases they form with their neighbours
+
+    Phrases are adjacent content-word pairs and "x of/by y" triples; they
+    never bridge other stopwords, so "rule for derivatives" is not a topic.
+    """
+    words = [match.lower().strip("-'") for match in WORD_PATTERN.findall(text)]
+    result = [word for word in words if is_content_word(word)]
+    for i, word in enumerate(words[:-1]):
+        if not is_content_word(word):
+            continue
+        if is_content_word(words[i + 1]):
+            result.append(f'{word} {words[i + 1]}')
+        elif words[i + 1] in PHRASE_CONNECTORS and i + 2 < len(words) and is_content_word(words[i + 2]):
+            result.append(f'{word} {words[i + 1]} {words[i + 2]}')
+    return result
+
+
+def math_spans(line):
+    """Runs of math-like tokens in a line of prose that contain a relation or math symbol"""
+    spans = []
+    run = []
+
+    def flush():
+        span = ' '.join(run)
+        if len(run) >= 4 and (ASSIGNMENT.search(span) or MATH_SYMBOLS.search(span) or MATH_COMMANDS.search(span)):
+            spans.append(span)
+        run.clear()
+
+    for token in line.split():
+        bare = token.strip('.,;:')
+        # Single letters, short non-stopwords and anything with digits or symbols is math
+        if bare and (len(bare) == 1 or not bare.isalpha() or (len(bare) <= 3 and bare.lower() not in STOPWORDS)):
+            run.append(bare)
+            if bare == token:
+                continue
+        # Other words and trailing punctuation end the run
+        flush()
+    flush()
+    return spans
+
+
+class LocalProvider(AnalysisProvider):
+    """Offline analysis in milliseconds, with no network access
+
+    Key topics are the note's highest TF-IDF terms against the rest of the
+    class, equations are found with math-notation heuristics, and the
+    highlights are the sentences most similar to the rest of the note.
+    """
+    name = 'local'
+
+    def __init__(self, corpus_loader=None):
+        # corpus_loader(subject, class_name) -> list of other note texts in the class
+        self.corpus_loader = corpus_loader
+        self._df_cache = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self._lock = threading.Lock()
+
+    def analyze_file(self, filepath, subject, class_name, index_key=None, content=None):
+        if content is None:
+            content = extract_text(filepath)
+        return self.analyze_text(content, subject, class_name, index_key)
+
+    def analyze_text(self, content, subject, class_name, index_key=None):
+        with stage_timer('local_analysis'):
+            return self._analyze(content or '', subject, class_name, index_key)
+
+    def _document_frequencies(self, subject, class_name):
+        """Return (document frequency of each term, number of documents) for the class corpus"""
+        key = (subject, class_name)
+        with self._lock:
+            cached = self._df_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < CORPUS_REFRESH_SECONDS:
+            return cached[1], cached[2]
+
+        corpus = self.corpus_loader(subject, class_name) if self.corpus_loader else []
+        frequencies = {}
+        for document in corpus:
+            for term in set(terms(document)):
+                frequencies[term] = frequencies.get(term, 0) + 1
+        with self._lock:
+            self._df_cache[key] = (time.monotonic(), frequencies, len(corpus))
+        return frequencies, len(corpus)
+
+    def _key_topics(self, content, subject, class_name):
+        counts = {}
+        for term in terms(content):
+            counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return [], {}
+
+        frequencies, documents = self._document_frequencies(subject, class_name)
+        scores = {}
+        for term, count in counts.items():
+            # Phrases must repeat to count as a topic
+            if ' ' in term and count < 2:
+                continue
+            idf = math.log((1 + documents) / (1 + frequencies.get(term, 0))) + 1
+            if ' ' in term:
+                weight = 1.5
+            elif term.endswith(('ed', 'ing')):
+                # Bare verb forms ("derived", "choosing") make poor topics
+                weight = 0.5
+            else:
+                weight = 1
+            scores[term] = (1 + math.log(count)) * idf * weight
+
+        ranked = sorted(scores, key=lambda term: (-scores[term], term))
+        topics = []
+        for term in ranked:
+            # Skip words already covered by a chosen bigram and vice versa
+            if any(term in chosen.split() or chosen in term.split() for chosen in topics):
+                continue
+            topics.append(term)
+            if len(topics) == MAX_TOPICS * 2:
+                break
+        return topics, scores
+
+    @staticmethod
+    def _equations(content):
+        equations = []
+        for line in content.splitlines():
+            line = line.strip()
+            if not line or len(line) > 200:
+                continue
+            signals = (bool(MATH_SYMBOLS.search(line)) + bool(MATH_COMMANDS.search(line))
+                       + bool(MATH_NOTATION.search(line)) + bool(ASSIGNMENT.search(line)))
+            # Prose rarely has more than one signal; short lines need only an assignment
+            if len(line.split()) <= 8 and (signals >= 2 or ASSIGNMENT.search(line)):
+                found = [line]
+            elif signals >= 2:
+                found = math_spans(line)
+            else:
+                found = []
+            for equation in found:
+                if equation not in equations:
+                    equations.append(equation)
+        return equations[:MAX_EQUATIONS]
+
+    @staticmethod
+    def _central_sentences(sentences, scores):
+        """Rank sentences by total cosine similarity to the other sentences"""
+        vectors = []
+        for sentence in sentences:
+            vector = {}
+            for term in terms(sentence):
+                if term in scores:
+                    vector[term] = vector.get(term, 0) + scores[term]
+            norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1
+            vectors.append({term: weight / norm for term, weight in vector.items()})
+
+        # Summed cosine similarity to every other sentence is the dot product
+        # with the sum of all vectors minus the sentence's own (unit) norm
+        total = {}
+        for vector in vectors:
+            for term, weight in vector.items():
+                total[term] = total.get(term, 0) + weight
+        centrality = [sum(weight * total[term] for term, weight in vector.items()) - (1 if vector else 0)
+                      for vector in vectors]
+
+        return sorted(range(len(sentences)), key=lambda i: -centrality[i])
+
+    def _analyze(self, content, subject, class_name, index_key):
+        readable = is_readable(content)
+        if not readable:
+            content = ''
+        ranked_terms, scores = self._key_topics(content, subject, class_name)
+        key_topics = [term.title() for term in ranked_terms[:MAX_TOPICS]]
+        equations = self._equations(content)
+
+        sentences = [sentence.strip() for sentence in SENTENCE_SPLIT.split(content)
+                     if 6 <= len(sentence.split()) <= 60]
+        order = self._central_sentences(sentences, scores) if sentences else []
+        top = sorted(order[:MAX_POINTS])
+
+        important_points = []
+        for i in top:
+            sentence = sentences[i]
+            shared = [term for term in ranked_terms[:MAX_TOPICS] if term in sentence.lower()]
+            if sentence in equations or MATH_SYMBOLS.search(sentence) or ASSIGNMENT.search(sentence):
+                point_type = 'formula'
+            elif DEFINITION.search(sentence):
+                point_type = 'definition'
+            else:
+                point_type = 'concept'
+            explanation = ('Central to this note' + (f"; covers {', '.join(shared)}" if shared else '')
+                           + '.')
+            important_points.append({'text': sentence, 'explanation': explanation, 'type': point_type})
+
+        test_questions = [f'Explain {topic.lower()} and give an example.' for topic in key_topics[:3]]
+        test_questions += [f'When would you use {equation}?' for equation in equations[:2]]
+
+        if not readable:
+            index_relevance = 'No readable text in this file; scanned or handwritten pages need Gemini analysis'
+        elif index_key and index_key != 'general':
+            index_relevance = f'Filed under textbook section {index_key}; main topics: {", ".join(key_topics[:3])}'
+        else:
+            index_relevance = f'Main topics: {", ".join(key_topics[:3])}' if key_topics else 'No textbook section detected'
+
+        return {
+            'subject_match': True,
+            'key_topics': key_topics,
+            'important_equations': equations,
+            'highlights': [sentences[i] for i in top[:3]],
+            'important_points': important_points,
+            'test_questions': test_questions,
+            'related_links': [term.title() for term in ranked_terms[MAX_TOPICS:MAX_TOPICS + 4]],
+            'index_relevance': index_relevance,
+            'provider': self.name
+        }
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_MIMETYPES = ['application/json', 'text/html']
+
+
+def parse_fields(fields_param):
+    """Split a ?fields= query value into dotted paths"""
+    if not fields_param:
+        return None
+    return [field.strip().split('.') for field in fields_param.split(',') if field.strip()]
+
+
+# Returned by _project when a path does not exist in the data
+_MISSING = object()
+
+
+def _project(data, path):
+    """Project a single dotted path; '*' matches every key of a dict
+
+    Keys matched by '*' are kept even when the rest of the path is missing
+    under them, so ?fields=classes.*.name still lists every class.
+    """
+    if not path:
+        return data
+    key, rest = path[0], path[1:]
+    if not isinstance(data, dict):
+        return _MISSING
+    if key == '*':
+        projected = {}
+        for name, value in data.items():
+            value = _project(value, rest)
+            projected[name] = {} if value is _MISSING else value
+        return projected
+    if key not in data:
+        return _MISSING
+    value = _project(data[key], rest)
+    return _MISSING if value is _MISSING else {key: value}
+
+
+def _merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def project_fields(data, fields):
+    """Keep only the requested dotted field paths of data
+
+    Paths that do not exist are left out. Returns data unchanged when no
+    fields are requested.
+    """
+    if not fields:
+        return data
+    projected = {}
+    for path in fields:
+        value = _project(data, path)
+        if isinstance(value, dict):
+            _merge(projected, value)
+    return projected
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported content encoding from Accept-Encoding"""
+    if brotli is not None and 'br' in accept_encodings:
+        return 'br'
+    if 'gzip' in accept_encodings:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, request):
+    """Add an ETag and compress JSON/HTML responses for the client's Accept-Encoding
+
+    The ETag is derived from the uncompressed body plus the encoding, so
+    conditional requests are answered with 304 before any compression work.
+    """
+    if (request.method != 'GET' or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    encoding = choose_encoding(request.accept_encodings) if len(body) >= COMPRESS_MIN_SIZE else None
+
+    etag = hashlib.md5(body).hexdigest()
+    if encoding:
+        etag = f'{etag}-{encoding}'
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+
+    response.make_conditional(request)
+    if response.status_code == 304 or not encoding:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(body))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=6, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,45 +1,165 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+from flask import Blueprint, Flask, Response, abort, current_app, g, has_app_context, render_template, request, jsonify, redirect, url_for, send_from_directory, stream_with_context
 import os
 import json
+import time
+import hashlib
+import logging
+import mimetypes
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-import google.generativeai as genai
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from dotenv import load_dotenv
 import re
 import html
 
-# Load environment variables from .env file
-load_dotenv()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['INDEX_UPLOAD_FOLDER'] = 'uploads/indices'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Ensure upload directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['INDEX_UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs('data', exist_ok=True)
-
-# Configure Gemini AI
-# You'll need to set your API key as an environment variable: GOOGLE_API_KEY
-api_key = os.getenv('GOOGLE_API_KEY')
-if not api_key:
-    print("WARNING: GOOGLE_API_KEY not found in environment variables!")
-    print("Please create a .env file with your API key:")
-    print("GOOGLE_API_KEY=your_api_key_here")
-else:
-    print(f"API Key loaded: {api_key[:10]}..." if len(api_key) > 10 else "API Key loaded")
-
-if api_key:
-    genai.configure(api_key=api_key)
-    # Use the correct model name for Gemini
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    print("✅ Gemini model configured successfully")
-else:
-    model = None
-    print("❌ No API key provided - AI analysis will be disabled")
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes are serialized between threads only
+    fcntl = None
+from api_utils import parse_fields, project_fields, compress_response
+import metrics
+from metrics import stage_timer
+from ai_parsing import AIResponseParseError, validate_fields
+from analysis_providers import GeminiProvider, LocalProvider, extract_text
+
+logger = logging.getLogger('edunote')
+
+# All routes live on this blueprint; create_app() builds the Flask app around it
+bp = Blueprint('main', __name__)
+
+# Analysis backend for this process. Providers create their network clients
+# lazily, so nothing heavy is imported or connected until the first upload.
+_provider = GeminiProvider()
+
+# Analysis providers that may be selected with ANALYSIS_PROVIDER
+ANALYSIS_PROVIDERS = ('auto', 'gemini', 'local')
+
+# In-flight AI analyses, so a shutting-down worker can let them finish
+_jobs = threading.Condition()
+_active_jobs = 0
+_draining = False
+
+# Serializes read-modify-write of the JSON data files; data_lock() adds an
+# flock so worker processes are serialized too
+_data_lock = threading.Lock()
+
+def load_class_corpus(subject, class_name):
+    """Return the text of every note in a class, for the local analyzer's IDF"""
+    notes_data = load_data(NOTES_DATA_FILE, {})
+    return [note.get('content', '')
+            for index_notes in notes_data.get(subject, {}).get(class_name, {}).values()
+            for note in index_notes
+            if not note.get('content', '').startswith('[File content could not be read')]
+
+# Offline analyzer used when Gemini is not configured or fails
+_local_provider = LocalProvider(corpus_loader=load_class_corpus)
+
+def analysis_mode():
+    """Return the configured ANALYSIS_PROVIDER: auto, gemini or local"""
+    if has_app_context():
+        return current_app.config['ANALYSIS_PROVIDER']
+    return os.getenv('ANALYSIS_PROVIDER', 'auto')
+
+def get_provider():
+    """Return this process's analysis provider, or None if it is not configured
+
+    In auto mode Gemini is used when GOOGLE_API_KEY is set and the local
+    analyzer otherwise.
+    """
+    mode = analysis_mode()
+    if mode == 'local':
+        return _local_provider
+    if _provider.is_available():
+        return _provider
+    return _local_provider if mode == 'auto' else None
+
+def fallback_analysis(provider, failed_analysis, method, *args, **kwargs):
+    """Replace a failed Gemini analysis with a local one in auto mode"""
+    if provider is _local_provider or analysis_mode() != 'auto':
+        return failed_analysis
+    
+    try:
+        analysis = getattr(_local_provider, method)(*args, **kwargs)
+    except Exception:
+        logger.exception("local fallback analysis failed")
+        return failed_analysis
+    
+    metrics.inc('edunote_ai_fallbacks_total', provider=provider.name)
+    logger.warning("%s analysis failed - using local analysis", provider.name)
+    analysis['fallback_reason'] = failed_analysis.get('error') or failed_analysis.get('json_error')
+    return analysis
+
+def _reset_after_fork():
+    """Drop state inherited from the parent process"""
+    global _jobs, _active_jobs, _draining, _data_lock
+    _provider.reset()
+    _local_provider.reset()
+    _jobs = threading.Condition()
+    _active_jobs = 0
+    _draining = False
+    _data_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+@contextmanager
+def analysis_job():
+    """Track an AI analysis so drain_analysis_jobs() can wait for it"""
+    global _active_jobs
+    with _jobs:
+        _active_jobs += 1
+    try:
+        yield
+    finally:
+        with _jobs:
+            _active_jobs -= 1
+            _jobs.notify_all()
+
+def begin_draining():
+    """Refuse new uploads with 503 from now on"""
+    global _draining
+    with _jobs:
+        _draining = True
+
+def drain_analysis_jobs(timeout=None):
+    """Stop accepting uploads and wait for in-flight analyses; returns True if all finished"""
+    begin_draining()
+    with _jobs:
+        if _active_jobs:
+            logger.info("draining in-flight analyses count=%d pid=%d", _active_jobs, os.getpid())
+        finished = _jobs.wait_for(lambda: _active_jobs == 0, timeout)
+    if not finished:
+        logger.warning("shutdown with analyses still running count=%d pid=%d", _active_jobs, os.getpid())
+    return finished
+
+metrics.describe('edunote_http_request_duration_seconds', 'Request latency by route, until the last byte of streamed responses')
+metrics.describe('edunote_upload_stage_seconds', 'Time spent in each stage of a note upload')
+metrics.describe('edunote_upload_seconds', 'Total note upload time by mode')
+metrics.describe('edunote_upload_first_content_seconds', 'Time until the first analysis field is streamed')
+metrics.describe('edunote_data_file_seconds', 'JSON data file load/save time')
+metrics.describe('edunote_data_file_bytes', 'Size of each JSON data file when last read or written')
+metrics.describe('edunote_gemini_tokens_total', 'Gemini tokens used by kind')
+metrics.describe('edunote_ai_errors_total', 'AI analysis errors by exception class')
+metrics.describe('edunote_ai_parse_results_total', 'AI response parse attempts by outcome (success, repaired, failed)')
+metrics.describe('edunote_ai_parse_seconds', 'Time to parse and validate an AI response')
+
+# Analysis fields relayed to the client while a streaming upload is generated,
+# in the order the prompt asks for them
+STREAMED_FIELDS = ['key_topics', 'important_equations', 'highlights', 'important_points',
+                   'test_questions', 'related_links', 'index_relevance']
+
+# Pagination for note lists on the class and final note pages
+NOTES_PAGE_SIZE = 10
+MAX_NOTES_PAGE_SIZE = 50
+SUMMARY_ANALYSIS_FIELDS = ['important_points', 'test_questions', 'important_equations']
+MAX_BATCH_NOTES = 100
+
+# Uploaded files are named "YYYYmmdd_HHMMSS_<name>" and never overwritten
+UPLOAD_NAME_PATTERN = re.compile(r'^\d{8}_\d{6}_')
+IMMUTABLE_FILE_MAX_AGE = 365 * 24 * 60 * 60
+_file_etag_cache = {}
 
 # Data storage (in production, use a proper database)
 NOTES_DATA_FILE = 'data/notes.json'
@@ -49,15 +169,50 @@ INDICES_DATA_FILE = 'data/indices.json'
 def load_data(filename, default=None):
     """Load data from JSON file"""
     try:
-        with open(filename, 'r') as f:
-            return json.load(f)
+        with metrics.timed('edunote_data_file_seconds', op='load', file=os.path.basename(filename)):
+            with open(filename, 'r') as f:
+                data = json.load(f)
+                metrics.set_gauge('edunote_data_file_bytes', f.tell(), file=os.path.basename(filename))
+                return data
     except FileNotFoundError:
         return default if default is not None else {}
 
 def save_data(filename, data):
-    """Save data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Save data to JSON file
+
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partially written file.
+    """
+    temp_filename = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with metrics.timed('edunote_data_file_seconds', op='save', file=os.path.basename(filename)):
+        try:
+            with open(temp_filename, 'w') as f:
+                json.dump(data, f, indent=2)
+                metrics.set_gauge('edunote_data_file_bytes', f.tell(), file=os.path.basename(filename))
+            os.replace(temp_filename, filename)
+        except BaseException:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
+@contextmanager
+def data_lock():
+    """Hold while loading, changing and saving the data files
+
+    Without it, concurrent uploads in different threads or gunicorn workers
+    overwrite each other's notes and hand out duplicate ids.
+    """
+    with _data_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = os.path.join(os.path.dirname(NOTES_DATA_FILE) or '.', '.lock')
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 def clean_html_tags(text):
     """Clean up HTML tags and convert to readable format"""
@@ -96,6 +251,8 @@ def clean_ai_analysis(analysis):
     # Clean important points
     if 'important_points' in analysis:
         for point in analysis['important_points']:
+            if not isinstance(point, dict):
+                continue
             if 'text' in point:
                 point['text'] = clean_html_tags(point['text'])
             if 'explanation' in point:
@@ -115,19 +272,54 @@ def clean_ai_analysis(analysis):
     
     return analysis
 
-@app.route('/')
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    """Record per-route latency and status counts"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        
+        def observe_duration():
+            metrics.observe('edunote_http_request_duration_seconds', time.perf_counter() - started,
+                            route=route, method=method)
+        
+        # A streamed body (e.g. /upload/stream) is still being generated here,
+        # so it is timed until the server closes the response
+        if response.is_streamed:
+            response.call_on_close(observe_duration)
+        else:
+            observe_duration()
+        metrics.inc('edunote_http_requests_total', route=route, method=method, status=response.status_code)
+    return response
+
+@bp.after_app_request
+def add_caching_and_compression(response):
+    """Add ETags and gzip/brotli compression to API and page responses"""
+    return compress_response(response, request)
+
+@bp.route('/metrics')
+def get_metrics():
+    """Expose metrics in the Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
 def home():
     """Home page displaying subject folders"""
     subjects = load_data(SUBJECTS_DATA_FILE, {})
     return render_template('index.html', subjects=subjects)
 
-@app.route('/manage')
+@bp.route('/manage')
 def manage():
     """Management page for subjects and classes"""
     subjects = load_data(SUBJECTS_DATA_FILE, {})
     return render_template('manage.html', subjects=subjects)
 
-@app.route('/api/subject', methods=['POST'])
+@bp.route('/api/subject', methods=['POST'])
 def create_subject():
     """Create a new subject"""
     data = request.get_json()
@@ -136,20 +328,21 @@ def create_subject():
     if not subject_name:
         return jsonify({'error': 'Subject name required'}), 400
     
-    subjects = load_data(SUBJECTS_DATA_FILE, {})
-    if subject_name in subjects:
-        return jsonify({'error': 'Subject already exists'}), 400
-    
-    subjects[subject_name] = {
-        'name': subject_name,
-        'classes': {},
-        'created_date': datetime.now().isoformat()
-    }
-    
-    save_data(SUBJECTS_DATA_FILE, subjects)
+    with data_lock():
+        subjects = load_data(SUBJECTS_DATA_FILE, {})
+        if subject_name in subjects:
+            return jsonify({'error': 'Subject already exists'}), 400
+        
+        subjects[subject_name] = {
+            'name': subject_name,
+            'classes': {},
+            'created_date': datetime.now().isoformat()
+        }
+        
+        save_data(SUBJECTS_DATA_FILE, subjects)
     return jsonify({'success': True, 'subject': subjects[subject_name]})
 
-@app.route('/api/subject/<subject_name>/class', methods=['POST'])
+@bp.route('/api/subject/<subject_name>/class', methods=['POST'])
 def create_class(subject_name):
     """Create a new class within a subject"""
     data = request.get_json()
@@ -158,24 +351,25 @@ def create_class(subject_name):
     if not class_name:
         return jsonify({'error': 'Class name required'}), 400
     
-    subjects = load_data(SUBJECTS_DATA_FILE, {})
-    if subject_name not in subjects:
-        return jsonify({'error': 'Subject not found'}), 404
-    
-    if class_name in subjects[subject_name]['classes']:
-        return jsonify({'error': 'Class already exists'}), 400
-    
-    subjects[subject_name]['classes'][class_name] = {
-        'name': class_name,
-        'indices': {},
-        'note_count': 0,
-        'created_date': datetime.now().isoformat()
-    }
-    
-    save_data(SUBJECTS_DATA_FILE, subjects)
+    with data_lock():
+        subjects = load_data(SUBJECTS_DATA_FILE, {})
+        if subject_name not in subjects:
+            return jsonify({'error': 'Subject not found'}), 404
+        
+        if class_name in subjects[subject_name]['classes']:
+            return jsonify({'error': 'Class already exists'}), 400
+        
+        subjects[subject_name]['classes'][class_name] = {
+            'name': class_name,
+            'indices': {},
+            'note_count': 0,
+            'created_date': datetime.now().isoformat()
+        }
+        
+        save_data(SUBJECTS_DATA_FILE, subjects)
     return jsonify({'success': True, 'class': subjects[subject_name]['classes'][class_name]})
 
-@app.route('/upload-index', methods=['POST'])
+@bp.route('/upload-index', methods=['POST'])
 def upload_index():
     """Upload textbook index for a class"""
     if 'file' not in request.files:
@@ -195,7 +389,7 @@ def upload_index():
     filename = secure_filename(file.filename)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{timestamp}_{filename}"
-    filepath = os.path.join(app.config['INDEX_UPLOAD_FOLDER'], filename)
+    filepath = os.path.join(current_app.config['INDEX_UPLOAD_FOLDER'], filename)
     file.save(filepath)
     
     # Read and parse index content
@@ -210,21 +404,22 @@ def upload_index():
     index_structure = parse_textbook_index(content)
     
     # Save index data
-    indices = load_data(INDICES_DATA_FILE, {})
-    if subject not in indices:
-        indices[subject] = {}
-    if class_name not in indices[subject]:
-        indices[subject][class_name] = {}
-    
-    indices[subject][class_name] = {
-        'filename': filename,
-        'original_name': file.filename,
-        'content': content,
-        'structure': index_structure,
-        'upload_date': datetime.now().isoformat()
-    }
-    
-    save_data(INDICES_DATA_FILE, indices)
+    with data_lock():
+        indices = load_data(INDICES_DATA_FILE, {})
+        if subject not in indices:
+            indices[subject] = {}
+        if class_name not in indices[subject]:
+            indices[subject][class_name] = {}
+        
+        indices[subject][class_name] = {
+            'filename': filename,
+            'original_name': file.filename,
+            'content': content,
+            'structure': index_structure,
+            'upload_date': datetime.now().isoformat()
+        }
+        
+        save_data(INDICES_DATA_FILE, indices)
     
     return jsonify({'success': True, 'structure': index_structure})
 
@@ -284,7 +479,7 @@ def parse_textbook_index(content):
     
     return structure
 
-@app.route('/subject/<subject_name>')
+@bp.route('/subject/<subject_name>')
 def subject_page(subject_name):
     """Display classes within a subject"""
     subjects = load_data(SUBJECTS_DATA_FILE, {})
@@ -294,7 +489,7 @@ def subject_page(subject_name):
     classes = subjects[subject_name].get('classes', {})
     return render_template('subject.html', subject_name=subject_name, classes=classes)
 
-@app.route('/class/<subject_name>/<class_name>')
+@bp.route('/class/<subject_name>/<class_name>')
 def class_page(subject_name, class_name):
     """Display indices within a class"""
     indices = load_data(INDICES_DATA_FILE, {})
@@ -302,13 +497,6 @@ def class_page(subject_name, class_name):
     class_indices = indices.get(subject_name, {}).get(class_name, {})
     class_notes = notes_data.get(subject_name, {}).get(class_name, {})
     
-    # Clean AI analysis in class notes
-    if class_notes:
-        for index_key, index_notes in class_notes.items():
-            for note in index_notes:
-                if 'ai_analysis' in note:
-                    note['ai_analysis'] = clean_ai_analysis(note['ai_analysis'])
-    
     # Add note counts to each index
     if class_indices and 'structure' in class_indices:
         for item in class_indices['structure']:
@@ -316,13 +504,13 @@ def class_page(subject_name, class_name):
             note_count = len(class_notes.get(index_key, []))
             item['note_count'] = note_count
     
+    # Notes themselves are loaded on demand through /api/notes and /api/note
     return render_template('class.html', 
                          subject_name=subject_name, 
                          class_name=class_name, 
-                         indices=class_indices,
-                         class_notes=class_notes)
+                         indices=class_indices)
 
-@app.route('/index/<subject_name>/<class_name>/<index_key>')
+@bp.route('/index/<subject_name>/<class_name>/<index_key>')
 def index_page(subject_name, class_name, index_key):
     """Display notes within a specific index"""
     notes_data = load_data(NOTES_DATA_FILE, {})
@@ -349,11 +537,161 @@ def index_page(subject_name, class_name, index_key):
                          notes=index_notes,
                          summary_note=summary_note)
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload_note():
     """Handle note upload and AI evaluation"""
+    started = time.perf_counter()
+    if _draining:
+        return jsonify({'error': 'Server is shutting down, please retry'}), 503
+    
+    upload, error = save_note_upload()
+    if error:
+        return error
+    
+    with analysis_job():
+        start_text_extraction(upload, get_provider())
+        
+        # Process with Gemini AI directly using the file
+        ai_analysis = analyze_file_with_ai(upload)
+        
+        # Clean up HTML tags in AI analysis
+        with stage_timer('clean'):
+            ai_analysis = clean_ai_analysis(ai_analysis)
+        
+        note_data = store_note(upload, ai_analysis)
+    metrics.observe('edunote_upload_seconds', time.perf_counter() - started, mode='blocking')
+    
+    return jsonify({
+        'success': True,
+        'note_id': note_data['id'],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+
+@bp.route('/upload/stream', methods=['POST'])
+def upload_note_stream():
+    """Handle note upload and relay AI analysis to the client as it is generated"""
+    started = time.perf_counter()
+    if _draining:
+        return jsonify({'error': 'Server is shutting down, please retry'}), 503
+    
+    upload, error = save_note_upload()
+    if error:
+        return error
+    
+    def generate():
+        with analysis_job():
+            events = generate_analysis()
+            try:
+                # Not `yield from`, which would close the analysis along with this generator
+                for event in events:
+                    yield event
+            except GeneratorExit:
+                # The client went away; finish the analysis so the note is still stored
+                logger.info("streaming upload client disconnected - finishing analysis")
+                for _ in events:
+                    pass
+                raise
+    
+    def generate_analysis():
+        provider = get_provider()
+        first_content_ms = None
+        sent_fields = set()
+        yield sse_event('stage', {'stage': 'saved'})
+        start_text_extraction(upload, provider)
+        
+        if provider is None:
+            ai_analysis = analyze_file_with_ai(upload)
+        else:
+            ai_analysis = None
+            events = provider.stream_file(upload['filepath'], upload['subject'], upload['class_name'], upload['index_key'], upload.get('content'))
+            while ai_analysis is None:
+                # Only errors raised by the provider count as analysis failures
+                try:
+                    kind, value = next(events, (None, None))
+                    if kind is None:
+                        raise RuntimeError(f"{provider.name} analysis ended without a result")
+                except AIResponseParseError as e:
+                    metrics.inc('edunote_ai_errors_total', error_class='AIResponseParseError')
+                    logger.warning("streaming response could not be parsed error=%s", e)
+                    ai_analysis = fallback_analysis(provider, {
+                        "subject_match": True,
+                        "key_topics": ["AI Analysis"],
+                        "important_equations": [],
+                        "highlights": [],
+                        "important_points": [],
+                        "test_questions": [],
+                        "related_links": [],
+                        "raw_response": getattr(e, 'response_text', '')[:500],
+                        "json_error": str(e),
+                        "index_relevance": "AI analysis completed with parsing issues"
+                    }, 'analyze_file', upload['filepath'], upload['subject'], upload['class_name'], upload['index_key'], note_text(upload))
+                    break
+                except Exception as e:
+                    metrics.inc('edunote_ai_errors_total', error_class=type(e).__name__)
+                    logger.exception("streaming AI analysis failed")
+                    ai_analysis = fallback_analysis(provider, {
+                        "subject_match": True,
+                        "key_topics": ["Analysis failed"],
+                        "important_equations": [],
+                        "highlights": [],
+                        "important_points": [],
+                        "test_questions": [],
+                        "related_links": [],
+                        "error": str(e),
+                        "index_relevance": "AI file analysis failed"
+                    }, 'analyze_file', upload['filepath'], upload['subject'], upload['class_name'], upload['index_key'], note_text(upload))
+                    break
+                
+                if kind == 'stage':
+                    yield sse_event('stage', {'stage': value})
+                elif kind == 'partial':
+                    # Relay each field as soon as its value is complete, in its stored shape
+                    new_fields = validate_fields({key: field for key, field in value.items()
+                                                  if key in STREAMED_FIELDS and key not in sent_fields})
+                    if new_fields:
+                        if first_content_ms is None:
+                            first_content_ms = round((time.perf_counter() - started) * 1000, 1)
+                        sent_fields.update(new_fields)
+                        yield sse_event('partial', clean_ai_analysis(new_fields))
+                elif kind == 'done':
+                    ai_analysis = value
+        
+        with stage_timer('clean'):
+            ai_analysis = clean_ai_analysis(ai_analysis)
+        analysis_fields = {key: ai_analysis[key] for key in STREAMED_FIELDS if key in ai_analysis}
+        remaining = {key: field for key, field in analysis_fields.items() if key not in sent_fields}
+        if remaining:
+            if first_content_ms is None:
+                first_content_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event('partial', remaining)
+        
+        note_data = store_note(upload, ai_analysis)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        metrics.observe('edunote_upload_seconds', elapsed_ms / 1000, mode='streaming')
+        if first_content_ms is not None:
+            metrics.observe('edunote_upload_first_content_seconds', first_content_ms / 1000)
+        logger.info("streaming upload complete first_content_ms=%s elapsed_ms=%s", first_content_ms, elapsed_ms)
+        
+        # The stored analysis replaces whatever was streamed, e.g. after a local fallback
+        yield sse_event('done', {
+            'success': True,
+            'note_id': note_data['id'],
+            'analysis': analysis_fields,
+            'first_content_ms': first_content_ms,
+            'elapsed_ms': elapsed_ms
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(event, data):
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def save_note_upload():
+    """Validate the upload form and save the file, returning (upload, error_response)"""
     if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+        return None, (jsonify({'error': 'No file uploaded'}), 400)
     
     file = request.files['file']
     subject = request.form.get('subject')
@@ -361,87 +699,125 @@ def upload_note():
     index_key = request.form.get('index_key')
     
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return None, (jsonify({'error': 'No file selected'}), 400)
     
     if not subject or not class_name:
-        return jsonify({'error': 'Subject and class name required'}), 400
+        return None, (jsonify({'error': 'Subject and class name required'}), 400)
     
     # Save uploaded file
     filename = secure_filename(file.filename)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{timestamp}_{filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    with stage_timer('save'):
+        file.save(filepath)
     
-    # Process with Gemini AI directly using the file
-    ai_analysis = analyze_file_with_ai(filepath, filename, subject, class_name, index_key)
+    return {
+        'filepath': filepath,
+        'filename': filename,
+        'original_name': file.filename,
+        'subject': subject,
+        'class_name': class_name,
+        'index_key': index_key
+    }, None
+
+def extract_note_text(upload):
+    """Extract the uploaded file's text once, for storage and text-based analysis"""
+    with stage_timer('extract_text'):
+        upload['content'] = extract_text(upload['filepath'])
+    return upload['content']
+
+def start_text_extraction(upload, provider):
+    """Extract the upload's text before the local analyzer runs, or alongside any other provider
+
+    Gemini reads the file itself, so the text, which takes seconds for a
+    PDF, is only needed for storage and is extracted on a background thread
+    while the analysis is generated. note_text() waits for it.
+    """
+    if provider is _local_provider:
+        extract_note_text(upload)
+        return
     
-    # Clean up HTML tags in AI analysis
-    ai_analysis = clean_ai_analysis(ai_analysis)
+    extraction = threading.Thread(target=extract_note_text, args=(upload,), name='extract-text', daemon=True)
+    upload['extraction'] = extraction
+    extraction.start()
+
+def note_text(upload):
+    """Return the upload's extracted text, waiting for a background extraction to finish"""
+    extraction = upload.pop('extraction', None)
+    if extraction is not None:
+        extraction.join()
+    return upload['content']
+
+def store_note(upload, ai_analysis):
+    """Store an analyzed note and update the class note count"""
+    filename = upload['filename']
+    subject = upload['subject']
+    class_name = upload['class_name']
+    index_key = upload['index_key']
     
-    # Also read file content for storage (fallback)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except:
-        content = f"[File content could not be read as text: {filename}]"
+    # Store the extracted text; the local analyzer's class corpus is built from it
+    content = note_text(upload) or f"[File content could not be read as text: {filename}]"
     
     # Determine the best matching index if not provided
     if not index_key:
         index_key = match_note_to_index(content, subject, class_name)
     
-    # Save note data with index structure
-    notes_data = load_data(NOTES_DATA_FILE, {})
-    if subject not in notes_data:
-        notes_data[subject] = {}
-    if class_name not in notes_data[subject]:
-        notes_data[subject][class_name] = {}
-    if index_key not in notes_data[subject][class_name]:
-        notes_data[subject][class_name][index_key] = []
-    
-    # Generate unique ID across all notes
-    max_id = 0
-    for subj_data in notes_data.values():
-        for class_data in subj_data.values():
-            for idx_data in class_data.values():
-                for note in idx_data:
-                    if note.get('id', 0) > max_id:
-                        max_id = note.get('id', 0)
-    
-    note_data = {
-        'id': max_id + 1,
-        'filename': filename,
-        'original_name': file.filename,
-        'content': content,
-        'upload_date': datetime.now().isoformat(),
-        'ai_analysis': ai_analysis,
-        'index_key': index_key,
-        'highlights': [],
-        'questions': [],
-        'stars': 0
-    }
-    
-    notes_data[subject][class_name][index_key].append(note_data)
-    save_data(NOTES_DATA_FILE, notes_data)
-    
-    # Update subjects data
-    subjects = load_data(SUBJECTS_DATA_FILE, {})
-    if subject not in subjects:
-        subjects[subject] = {'classes': {}}
-    if class_name not in subjects[subject]['classes']:
-        subjects[subject]['classes'][class_name] = {
-            'name': class_name,
-            'note_count': 0,
-            'created_date': datetime.now().isoformat()
+    # Save note data with index structure; ids come from the file, so hold the lock throughout
+    with data_lock():
+        with stage_timer('json_load'):
+            notes_data = load_data(NOTES_DATA_FILE, {})
+        if subject not in notes_data:
+            notes_data[subject] = {}
+        if class_name not in notes_data[subject]:
+            notes_data[subject][class_name] = {}
+        if index_key not in notes_data[subject][class_name]:
+            notes_data[subject][class_name][index_key] = []
+        
+        # Generate unique ID across all notes
+        max_id = 0
+        for subj_data in notes_data.values():
+            for class_data in subj_data.values():
+                for idx_data in class_data.values():
+                    for note in idx_data:
+                        if note.get('id', 0) > max_id:
+                            max_id = note.get('id', 0)
+        
+        note_data = {
+            'id': max_id + 1,
+            'filename': filename,
+            'original_name': upload['original_name'],
+            'content': content,
+            'upload_date': datetime.now().isoformat(),
+            'ai_analysis': ai_analysis,
+            'index_key': index_key,
+            'highlights': [],
+            'questions': [],
+            'stars': 0
         }
+        
+        notes_data[subject][class_name][index_key].append(note_data)
+        with stage_timer('json_save'):
+            save_data(NOTES_DATA_FILE, notes_data)
+        
+        # Update subjects data
+        subjects = load_data(SUBJECTS_DATA_FILE, {})
+        if subject not in subjects:
+            subjects[subject] = {'classes': {}}
+        if class_name not in subjects[subject]['classes']:
+            subjects[subject]['classes'][class_name] = {
+                'name': class_name,
+                'note_count': 0,
+                'created_date': datetime.now().isoformat()
+            }
+        
+        # Ensure note_count exists and increment it
+        if 'note_count' not in subjects[subject]['classes'][class_name]:
+            subjects[subject]['classes'][class_name]['note_count'] = 0
+        subjects[subject]['classes'][class_name]['note_count'] += 1
+        save_data(SUBJECTS_DATA_FILE, subjects)
     
-    # Ensure note_count exists and increment it
-    if 'note_count' not in subjects[subject]['classes'][class_name]:
-        subjects[subject]['classes'][class_name]['note_count'] = 0
-    subjects[subject]['classes'][class_name]['note_count'] += 1
-    save_data(SUBJECTS_DATA_FILE, subjects)
-    
-    return jsonify({'success': True, 'note_id': note_data['id']})
+    return note_data
 
 def match_note_to_index(content, subject, class_name):
     """Match note content to the best fitting textbook index"""
@@ -471,14 +847,19 @@ def match_note_to_index(content, subject, class_name):
     
     return best_match
 
-def analyze_file_with_ai(filepath, filename, subject, class_name, index_key=None):
-    """Use Gemini AI to analyze uploaded file directly"""
-    print(f"Starting AI file analysis for {subject} - {class_name}")
-    print(f"File: {filename}")
+def analyze_file_with_ai(upload):
+    """Use the analysis provider to analyze uploaded file directly"""
+    filepath = upload['filepath']
+    filename = upload['filename']
+    subject = upload['subject']
+    class_name = upload['class_name']
+    index_key = upload['index_key']
+    logger.info("starting AI file analysis subject=%s class=%s file=%s", subject, class_name, filename)
+    provider = get_provider()
     
     # Check if model is available
-    if model is None:
-        print("❌ AI model not available - returning basic analysis")
+    if provider is None:
+        logger.warning("AI model not available - returning basic analysis")
         return {
             "subject_match": True,
             "key_topics": ["AI analysis unavailable"],
@@ -491,89 +872,14 @@ def analyze_file_with_ai(filepath, filename, subject, class_name, index_key=None
             "index_relevance": "Analysis not available"
         }
     
-    index_context = ""
-    if index_key and index_key != "general":
-        index_context = f" This note appears to be related to textbook section: {index_key}."
-    
-    prompt = f"""
-    Analyze this uploaded file for a {subject} class ({class_name}) and provide:{index_context}
-    1. Subject classification (confirm if it matches {subject})
-    2. Key topics/concepts covered
-    3. Important equations or formulas (if any)
-    4. FIVE most important points or facts with specific explanations
-    5. Potential test questions
-    6. Related concepts or links to explore
-    7. Textbook index/chapter relevance
-    
-    For the important points, provide the exact text from the document and a detailed explanation.
-    
-    Respond in JSON format with the following structure:
-    {{
-        "subject_match": true/false,
-        "key_topics": ["topic1", "topic2"],
-        "important_equations": ["equation1", "equation2"],
-        "highlights": ["text to highlight", "another highlight"],
-        "important_points": [
-            {{
-                "text": "exact text from document",
-                "explanation": "detailed explanation of why this is important",
-                "type": "concept/formula/definition/example"
-            }}
-        ],
-        "test_questions": ["question1", "question2"],
-        "related_links": ["concept1", "concept2"],
-        "index_relevance": "description of how this relates to textbook structure"
-    }}
-    """
-    
     try:
-        print("Uploading file to Gemini AI...")
-        print(f"Using model: {model.model_name}")
-        
-        # Upload file to Gemini
-        uploaded_file = genai.upload_file(filepath)
-        print(f"✅ File uploaded successfully: {uploaded_file.name}")
+        return provider.analyze_file(filepath, subject, class_name, index_key, upload.get('content'))
         
-        # Generate content using the uploaded file
-        response = model.generate_content([uploaded_file, prompt])
-        print(f"API Response received: {len(response.text)} characters")
-        
-        # Parse the JSON response from Gemini
-        response_text = response.text.strip()
-        print(f"Response preview: {response_text[:200]}...")
-        
-        # Try to extract JSON from the response
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        
-        if json_match:
-            json_str = json_match.group()
-            ai_analysis = json.loads(json_str)
-        else:
-            # If no JSON found, create a basic structure from the response
-            ai_analysis = {
-                "subject_match": True,
-                "key_topics": ["Analysis completed"],
-                "important_equations": [],
-                "highlights": [],
-                "test_questions": [],
-                "related_links": [],
-                "raw_response": response_text[:500],  # Store first 500 chars of raw response
-                "index_relevance": "AI analysis completed"
-            }
-        
-        # Clean up uploaded file
-        try:
-            genai.delete_file(uploaded_file.name)
-            print("✅ Cleaned up uploaded file")
-        except:
-            print("⚠️ Could not delete uploaded file (may auto-expire)")
-        
-        return ai_analysis
-        
-    except json.JSONDecodeError as e:
+    except AIResponseParseError as e:
         # If JSON parsing fails, return the raw response
-        return {
+        metrics.inc('edunote_ai_errors_total', error_class='AIResponseParseError')
+        logger.warning("AI response could not be parsed error=%s", e)
+        return fallback_analysis(provider, {
             "subject_match": True,
             "key_topics": ["AI Analysis"],
             "important_equations": [],
@@ -581,13 +887,14 @@ def analyze_file_with_ai(filepath, filename, subject, class_name, index_key=None
             "important_points": [],
             "test_questions": [],
             "related_links": [],
-            "raw_response": response.text[:500] if 'response' in locals() else "No response received",
+            "raw_response": getattr(e, 'response_text', "No response received")[:500],
             "json_error": str(e),
             "index_relevance": "AI analysis completed with parsing issues"
-        }
+        }, 'analyze_file', filepath, subject, class_name, index_key, content=note_text(upload))
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ AI File Analysis Error: {error_msg}")
+        metrics.inc('edunote_ai_errors_total', error_class=type(e).__name__)
+        logger.exception("AI file analysis failed")
         
         # Check for specific error types
         if "credentials" in error_msg.lower():
@@ -599,7 +906,7 @@ def analyze_file_with_ai(filepath, filename, subject, class_name, index_key=None
         elif "file" in error_msg.lower():
             error_msg = "File upload issue - please check file format and size"
         
-        return {
+        return fallback_analysis(provider, {
             "subject_match": True,
             "key_topics": ["Analysis failed"],
             "important_equations": [],
@@ -610,16 +917,16 @@ def analyze_file_with_ai(filepath, filename, subject, class_name, index_key=None
             "error": error_msg,
             "raw_error": str(e),
             "index_relevance": "AI file analysis failed"
-        }
+        }, 'analyze_file', filepath, subject, class_name, index_key, content=note_text(upload))
 
 def analyze_note_with_ai(content, subject, class_name, index_key=None):
-    """Use Gemini AI to analyze the note content"""
-    print(f"Starting AI analysis for {subject} - {class_name}")
-    print(f"Content length: {len(content)} characters")
+    """Use the analysis provider to analyze the note content"""
+    logger.info("starting AI analysis subject=%s class=%s content_chars=%d", subject, class_name, len(content))
+    provider = get_provider()
     
     # Check if model is available
-    if model is None:
-        print("❌ AI model not available - returning basic analysis")
+    if provider is None:
+        logger.warning("AI model not available - returning basic analysis")
         return {
             "subject_match": True,
             "key_topics": ["AI analysis unavailable"],
@@ -632,80 +939,14 @@ def analyze_note_with_ai(content, subject, class_name, index_key=None):
             "index_relevance": "Analysis not available"
         }
     
-    index_context = ""
-    if index_key and index_key != "general":
-        index_context = f" This note appears to be related to textbook section: {index_key}."
-    
-    prompt = f"""
-    Analyze this note for a {subject} class ({class_name}) and provide:{index_context}
-    1. Subject classification (confirm if it matches {subject})
-    2. Key topics/concepts covered
-    3. Important equations or formulas (if any)
-    4. FIVE most important points or facts with specific explanations
-    5. Potential test questions
-    6. Related concepts or links to explore
-    7. Textbook index/chapter relevance
-    
-    For the important points, provide the exact text from the note and a detailed explanation.
-    
-    Note content:
-    {content[:2000]}  # Limit content to avoid token limits
-    
-    Respond in JSON format with the following structure:
-    {{
-        "subject_match": true/false,
-        "key_topics": ["topic1", "topic2"],
-        "important_equations": ["equation1", "equation2"],
-        "highlights": ["text to highlight", "another highlight"],
-        "important_points": [
-            {{
-                "text": "exact text from document",
-                "explanation": "detailed explanation of why this is important",
-                "type": "concept/formula/definition/example"
-            }}
-        ],
-        "test_questions": ["question1", "question2"],
-        "related_links": ["concept1", "concept2"],
-        "index_relevance": "description of how this relates to textbook structure"
-    }}
-    """
-    
     try:
-        print("Calling Gemini API...")
-        print(f"Using model: {model.model_name}")
-        
-        response = model.generate_content(prompt)
-        print(f"API Response received: {len(response.text)} characters")
-        
-        # Parse the JSON response from Gemini
-        response_text = response.text.strip()
-        print(f"Response preview: {response_text[:200]}...")
-        
-        # Try to extract JSON from the response
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        return provider.analyze_text(content, subject, class_name, index_key)
         
-        if json_match:
-            json_str = json_match.group()
-            ai_analysis = json.loads(json_str)
-        else:
-            # If no JSON found, create a basic structure from the response
-            ai_analysis = {
-                "subject_match": True,
-                "key_topics": ["Analysis completed"],
-                "important_equations": [],
-                "highlights": [],
-                "test_questions": [],
-                "related_links": [],
-                "raw_response": response_text[:500],  # Store first 500 chars of raw response
-                "index_relevance": "AI analysis completed"
-            }
-        
-        return ai_analysis
-        
-    except json.JSONDecodeError as e:
+    except AIResponseParseError as e:
         # If JSON parsing fails, return the raw response
-        return {
+        metrics.inc('edunote_ai_errors_total', error_class='AIResponseParseError')
+        logger.warning("AI response could not be parsed error=%s", e)
+        return fallback_analysis(provider, {
             "subject_match": True,
             "key_topics": ["AI Analysis"],
             "important_equations": [],
@@ -713,13 +954,14 @@ def analyze_note_with_ai(content, subject, class_name, index_key=None):
             "important_points": [],
             "test_questions": [],
             "related_links": [],
-            "raw_response": response.text[:500] if 'response' in locals() else "No response received",
+            "raw_response": getattr(e, 'response_text', "No response received")[:500],
             "json_error": str(e),
             "index_relevance": "AI analysis completed with parsing issues"
-        }
+        }, 'analyze_text', content, subject, class_name, index_key)
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ AI Analysis Error: {error_msg}")
+        metrics.inc('edunote_ai_errors_total', error_class=type(e).__name__)
+        logger.exception("AI analysis failed")
         
         # Check for specific error types
         if "credentials" in error_msg.lower():
@@ -729,7 +971,7 @@ def analyze_note_with_ai(content, subject, class_name, index_key=None):
         elif "quota" in error_msg.lower():
             error_msg = "API quota exceeded - please try again later"
         
-        return {
+        return fallback_analysis(provider, {
             "subject_match": True,
             "key_topics": ["Analysis failed"],
             "important_equations": [],
@@ -740,7 +982,7 @@ def analyze_note_with_ai(content, subject, class_name, index_key=None):
             "error": error_msg,
             "raw_error": str(e),
             "index_relevance": "AI analysis failed"
-        }
+        }, 'analyze_text', content, subject, class_name, index_key)
 
 def create_summary_note(notes):
     """Create a summary note from all notes in a class"""
@@ -769,30 +1011,69 @@ def create_summary_note(notes):
     
     return summary
 
-@app.route('/api/note/<int:note_id>')
+@bp.route('/api/note/<int:note_id>')
 def get_note(note_id):
-    """Get specific note data"""
+    """Get specific note data, optionally projected with ?fields="""
     notes_data = load_data(NOTES_DATA_FILE, {})
+    notes = find_notes(notes_data, [note_id])
+    
+    if note_id not in notes:
+        return jsonify({'error': 'Note not found'}), 404
+    
+    fields = parse_fields(request.args.get('fields'))
+    return jsonify(project_fields(notes[note_id], fields))
+
+@bp.route('/api/notes/batch')
+def get_notes_batch():
+    """Get several notes by id in one request (?ids=1,2,3), optionally projected with ?fields="""
+    try:
+        note_ids = [int(note_id) for note_id in request.args.get('ids', '').split(',') if note_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid note ids'}), 400
+    
+    if not note_ids:
+        return jsonify({'error': 'Note ids required'}), 400
+    if len(note_ids) > MAX_BATCH_NOTES:
+        return jsonify({'error': f'At most {MAX_BATCH_NOTES} notes per request'}), 400
+    
+    notes_data = load_data(NOTES_DATA_FILE, {})
+    notes = find_notes(notes_data, note_ids)
+    fields = parse_fields(request.args.get('fields'))
+    
+    return jsonify({
+        'notes': [project_fields(notes[note_id], fields) for note_id in note_ids if note_id in notes],
+        'missing': [note_id for note_id in note_ids if note_id not in notes]
+    })
+
+def find_notes(notes_data, note_ids):
+    """Find notes by id, returning {id: note} with cleaned AI analysis"""
+    wanted = set(note_ids)
+    found = {}
     
     for subject_name, subject_data in notes_data.items():
         for class_name, class_data in subject_data.items():
             for index_key, index_notes in class_data.items():
                 for note in index_notes:
-                    if note.get('id') == note_id:
+                    if note.get('id') in wanted:
                         # Clean AI analysis before returning
                         if 'ai_analysis' in note:
                             note['ai_analysis'] = clean_ai_analysis(note['ai_analysis'])
-                        return jsonify(note)
+                        found[note['id']] = note
+                        if len(found) == len(wanted):
+                            return found
     
-    return jsonify({'error': 'Note not found'}), 404
+    return found
 
-@app.route('/api/subjects')
+@bp.route('/api/subjects')
 def get_subjects():
-    """Get all subjects and classes for dropdown"""
+    """Get all subjects and classes for dropdown, optionally projected per subject with ?fields="""
     subjects = load_data(SUBJECTS_DATA_FILE, {})
+    fields = parse_fields(request.args.get('fields'))
+    if fields:
+        subjects = {name: project_fields(subject, fields) for name, subject in subjects.items()}
     return jsonify(subjects)
 
-@app.route('/final-note/<subject_name>/<class_name>')
+@bp.route('/final-note/<subject_name>/<class_name>')
 def final_note_page(subject_name, class_name):
     """Display detailed final note study guide"""
     notes_data = load_data(NOTES_DATA_FILE, {})
@@ -800,25 +1081,110 @@ def final_note_page(subject_name, class_name):
     class_notes = notes_data.get(subject_name, {}).get(class_name, {})
     class_indices = indices.get(subject_name, {}).get(class_name, {})
     
-    # Clean AI analysis in class notes
-    if class_notes:
-        for index_key, index_notes in class_notes.items():
-            for note in index_notes:
-                if 'ai_analysis' in note:
-                    note['ai_analysis'] = clean_ai_analysis(note['ai_analysis'])
+    # Render only index headers; notes are fetched from /api/notes when an index is opened
+    index_counts = {index_key: len(index_notes) for index_key, index_notes in class_notes.items()}
     
     return render_template('final_note.html', 
                          subject_name=subject_name, 
                          class_name=class_name, 
-                         class_notes=class_notes,
+                         index_counts=index_counts,
+                         page_size=NOTES_PAGE_SIZE,
                          indices=class_indices)
 
-@app.route('/api/file/<filename>')
+@bp.route('/api/notes/<subject_name>/<class_name>/<index_key>')
+def get_index_notes_page(subject_name, class_name, index_key):
+    """Get a page of note summaries for an index, starting after the cursor note id"""
+    # A cursor that is silently ignored would restart the list at page 1
+    cursor = request.args.get('cursor')
+    try:
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    try:
+        limit = int(request.args.get('limit', NOTES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    notes_data = load_data(NOTES_DATA_FILE, {})
+    index_notes = notes_data.get(subject_name, {}).get(class_name, {}).get(index_key, [])
+    
+    return jsonify(paginate_notes(index_notes, cursor, limit))
+
+def note_summary(note):
+    """Summarize a note for list views, leaving out the stored content"""
+    ai_analysis = clean_ai_analysis(note.get('ai_analysis') or {})
+    return {
+        'id': note.get('id'),
+        'original_name': note.get('original_name'),
+        'upload_date': note.get('upload_date'),
+        'index_key': note.get('index_key'),
+        'stars': note.get('stars', 0),
+        'ai_analysis': {field: ai_analysis.get(field, []) for field in SUMMARY_ANALYSIS_FIELDS}
+    }
+
+def paginate_notes(index_notes, cursor=None, limit=None):
+    """Return one page of note summaries ordered by id, starting after the cursor id"""
+    limit = max(1, min(limit or NOTES_PAGE_SIZE, MAX_NOTES_PAGE_SIZE))
+    
+    ordered = sorted(index_notes, key=lambda note: note.get('id', 0))
+    if cursor is not None:
+        ordered = [note for note in ordered if note.get('id', 0) > cursor]
+    
+    page = ordered[:limit]
+    has_more = len(ordered) > limit
+    
+    return {
+        'notes': [note_summary(note) for note in page],
+        'total': len(index_notes),
+        'next_cursor': page[-1].get('id') if has_more else None
+    }
+
+@bp.route('/api/file/<filename>')
 def serve_file(filename):
-    """Serve uploaded files"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve uploaded files with caching headers and HTTP Range support"""
+    upload_folder = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+    filepath = safe_join(upload_folder, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
+    
+    # Timestamped upload names are never reused, so their bytes never change
+    max_age = IMMUTABLE_FILE_MAX_AGE if UPLOAD_NAME_PATTERN.match(filename) else None
+    etag = file_etag(filepath)
+    
+    if current_app.config['FILE_SENDFILE_MODE'] == 'x-accel':
+        # Let nginx stream the bytes from its internal location
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_REDIRECT_PREFIX'].rstrip('/') + '/' + filename
+        response.set_etag(etag)
+        response.make_conditional(request)
+    else:
+        # send_file answers Range and conditional requests itself; with
+        # USE_X_SENDFILE it hands the bytes to the front proxy instead
+        response = send_from_directory(upload_folder, filename, etag=etag, max_age=max_age)
+        # Advertise range support so PDF viewers can fetch pages progressively
+        response.accept_ranges = 'bytes'
+    
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    return response
+
+def file_etag(filepath):
+    """Strong ETag from the file's contents, cached per path, size and mtime"""
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    etag = _file_etag_cache.get(key)
+    if etag is None:
+        digest = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        _file_etag_cache[key] = etag
+    return etag
 
-@app.route('/api/note-counts')
+@bp.route('/api/note-counts')
 def get_all_note_counts():
     """Get note counts for all subjects"""
     notes_data = load_data(NOTES_DATA_FILE, {})
@@ -833,7 +1199,7 @@ def get_all_note_counts():
     
     return jsonify(subject_counts)
 
-@app.route('/api/note-counts/<subject_name>')
+@bp.route('/api/note-counts/<subject_name>')
 def get_subject_note_counts(subject_name):
     """Get note counts for all classes in a subject"""
     notes_data = load_data(NOTES_DATA_FILE, {})
@@ -848,7 +1214,7 @@ def get_subject_note_counts(subject_name):
     
     return jsonify(class_counts)
 
-@app.route('/api/note-counts/<subject_name>/<class_name>')
+@bp.route('/api/note-counts/<subject_name>/<class_name>')
 def get_note_counts(subject_name, class_name):
     """Get live note counts for a class"""
     notes_data = load_data(NOTES_DATA_FILE, {})
@@ -860,7 +1226,7 @@ def get_note_counts(subject_name, class_name):
     
     return jsonify(note_counts)
 
-@app.route('/api/indices/<subject_name>/<class_name>')
+@bp.route('/api/indices/<subject_name>/<class_name>')
 def get_indices(subject_name, class_name):
     """Get indices for a specific class"""
     indices = load_data(INDICES_DATA_FILE, {})
@@ -877,5 +1243,63 @@ def get_indices(subject_name, class_name):
             'has_index': False
         })
 
+def configure_logging():
+    """Configure leveled logging from LOG_LEVEL"""
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format='%(asctime)s %(levelname)s %(name)s %(process)d %(message)s'
+    )
+
+def create_app(config=None):
+    """Application factory
+
+    Loads .env, applies config overrides and registers the routes. It does
+    not create the Gemini client, so it is safe to call in a preloading
+    parent process before workers fork.
+    """
+    # Load environment variables from .env file
+    load_dotenv()
+    configure_logging()
+    
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['INDEX_UPLOAD_FOLDER'] = 'uploads/indices'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    
+    # Uploaded file delivery: unset serves bytes from Flask, 'x-sendfile' hands the
+    # path to Apache/lighttpd, 'x-accel' redirects nginx to an internal location
+    app.config['FILE_SENDFILE_MODE'] = os.getenv('FILE_SENDFILE_MODE')
+    app.config['USE_X_SENDFILE'] = app.config['FILE_SENDFILE_MODE'] == 'x-sendfile'
+    app.config['X_ACCEL_REDIRECT_PREFIX'] = os.getenv('X_ACCEL_REDIRECT_PREFIX', '/protected-uploads/')
+    
+    # Note analysis: 'gemini', 'local' (offline, no API key) or 'auto', which uses
+    # Gemini when configured and falls back to local analysis when it fails
+    app.config['ANALYSIS_PROVIDER'] = os.getenv('ANALYSIS_PROVIDER', 'auto')
+    
+    # With several worker processes, /metrics merges per-process snapshots kept here
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR')
+    
+    if config:
+        app.config.update(config)
+    
+    # Ensure upload directories exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['INDEX_UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(os.path.dirname(NOTES_DATA_FILE) or '.', exist_ok=True)
+    if app.config['METRICS_DIR']:
+        metrics.configure(app.config['METRICS_DIR'])
+    
+    if app.config['ANALYSIS_PROVIDER'] not in ANALYSIS_PROVIDERS:
+        raise ValueError(f"ANALYSIS_PROVIDER must be one of {', '.join(ANALYSIS_PROVIDERS)}")
+    if app.config['ANALYSIS_PROVIDER'] != 'local' and not os.getenv('GOOGLE_API_KEY'):
+        if app.config['ANALYSIS_PROVIDER'] == 'auto':
+            logger.warning("GOOGLE_API_KEY not set - using local analysis; add GOOGLE_API_KEY=<key> to .env for Gemini")
+        else:
+            logger.warning("GOOGLE_API_KEY not set - AI analysis disabled; add GOOGLE_API_KEY=<key> to .env")
+    
+    app.register_blueprint(bp)
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,280 @@
+"""Benchmark the upload, read and aggregate paths against a synthetic corpus
+
+Generates notes/subjects/indices JSON files of the requested size in a
+temporary directory, replaces the Gemini client with an in-process stub
+and drives the Flask test client. The stub takes --model-latency-ms to
+generate a response (spread over --stream-chunks chunks when streaming),
+so the streaming upload's time to first content can be compared with the
+blocking upload. Results can be saved as a baseline and compared on later
+runs. benchmarks/baselines/1k.json is the reference run with the default
+parameters; compare against it after changing a hot path.
+
+    python benchmarks/bench_app.py --compare benchmarks/baselines/1k.json
+    python benchmarks/bench_app.py --notes 10000
+    python benchmarks/bench_app.py --notes 10000 --save-baseline benchmarks/baselines/10k.json
+    python benchmarks/bench_app.py --notes 10000 --compare benchmarks/baselines/10k.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import types
+
+from harness import load_baseline, measure, print_results, save_baseline, summarize
+
+import app as edunote
+from analysis_providers import GeminiProvider
+
+SUBJECT = 'Math'
+CLASS_NAME = 'Math292'
+
+WORDS = ('integral derivative limit function series vector matrix theorem proof region '
+         'volume area surface polar coordinate substitution parts convergence sequence '
+         'gradient divergence curl continuity slope tangent normal chain rule product').split()
+
+
+def sentence(rng, length=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.'
+
+
+def make_analysis(rng):
+    return {
+        'subject_match': True,
+        'key_topics': [sentence(rng, 3) for _ in range(5)],
+        'important_equations': [f'x^{rng.randint(2, 9)} + y_{rng.randint(1, 9)} = z' for _ in range(3)],
+        'highlights': [sentence(rng) for _ in range(4)],
+        'important_points': [
+            {'text': sentence(rng), 'explanation': sentence(rng, 30), 'type': 'concept'}
+            for _ in range(5)
+        ],
+        'test_questions': [sentence(rng) + '?' for _ in range(5)],
+        'related_links': [sentence(rng, 2) for _ in range(3)],
+        'index_relevance': sentence(rng, 20)
+    }
+
+
+def make_index(rng, entries):
+    lines = []
+    chapter = 0
+    while len(lines) < entries:
+        chapter += 1
+        lines.append(f'Chapter {chapter}: {sentence(rng, 4)}')
+        for section in range(1, 9):
+            lines.append(f'{chapter}.{section} {sentence(rng, 4)}')
+    return '\n'.join(lines[:entries])
+
+
+def build_corpus(data_dir, note_count, index_entries, content_chars, seed):
+    """Write synthetic notes.json, subjects.json and indices.json into data_dir"""
+    rng = random.Random(seed)
+
+    index_content = make_index(rng, index_entries)
+    structure = edunote.parse_textbook_index(index_content)
+    index_keys = [item.get('number', item.get('title', '').lower().replace(' ', '_')) for item in structure]
+
+    class_notes = {}
+    for note_id in range(1, note_count + 1):
+        index_key = rng.choice(index_keys)
+        class_notes.setdefault(index_key, []).append({
+            'id': note_id,
+            'filename': f'20250101_000000_note_{note_id}.txt',
+            'original_name': f'note_{note_id}.txt',
+            'content': ' '.join(rng.choice(WORDS) for _ in range(content_chars // 8)),
+            'upload_date': '2025-01-01T00:00:00',
+            'ai_analysis': make_analysis(rng),
+            'index_key': index_key,
+            'highlights': [],
+            'questions': [],
+            'stars': rng.randint(0, 1)
+        })
+
+    notes = {SUBJECT: {CLASS_NAME: class_notes}}
+    subjects = {SUBJECT: {
+        'name': SUBJECT,
+        'classes': {CLASS_NAME: {'name': CLASS_NAME, 'indices': {}, 'note_count': note_count,
+                                 'created_date': '2025-01-01T00:00:00'}},
+        'created_date': '2025-01-01T00:00:00'
+    }}
+    indices = {SUBJECT: {CLASS_NAME: {
+        'filename': '20250101_000000_index.txt',
+        'original_name': 'index.txt',
+        'content': index_content,
+        'structure': structure,
+        'upload_date': '2025-01-01T00:00:00'
+    }}}
+
+    for name, data in (('notes.json', notes), ('subjects.json', subjects), ('indices.json', indices)):
+        with open(os.path.join(data_dir, name), 'w') as f:
+            json.dump(data, f, indent=2)
+
+    busiest = max(class_notes, key=lambda key: len(class_notes[key]))
+    return {'index_keys': index_keys, 'busiest_index': busiest, 'max_id': note_count}
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel with a fixed JSON response
+
+    Generating the response takes latency_ms; a streamed response arrives
+    in `chunks` evenly spaced pieces over the same time.
+    """
+    model_name = 'stub'
+
+    def __init__(self, seed, latency_ms=0, chunks=1):
+        self.text = json.dumps(make_analysis(random.Random(seed)))
+        self.latency_ms = latency_ms
+        self.chunks = max(1, chunks)
+        self.usage = types.SimpleNamespace(prompt_token_count=1000, candidates_token_count=len(self.text) // 4)
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        if stream:
+            return self._stream()
+        time.sleep(self.latency_ms / 1000)
+        return types.SimpleNamespace(text=self.text, usage_metadata=self.usage)
+
+    def _stream(self):
+        return StubStream(self)
+
+
+class StubStream:
+    """A streamed StubModel response; like genai's, it has the whole text and usage once iterated"""
+
+    def __init__(self, model):
+        self.model = model
+        self.text = model.text
+        self.usage_metadata = model.usage
+
+    def __iter__(self):
+        text = self.model.text
+        size = -(-len(text) // self.model.chunks)
+        for start in range(0, len(text), size):
+            time.sleep(self.model.latency_ms / 1000 / self.model.chunks)
+            yield types.SimpleNamespace(text=text[start:start + size], usage_metadata=self.usage_metadata)
+
+
+class StubGeminiProvider(GeminiProvider):
+    """The real Gemini provider with genai and the model replaced by in-process stubs"""
+
+    def __init__(self, seed, latency_ms=0, chunks=1):
+        super().__init__()
+        self._genai = types.SimpleNamespace(
+            upload_file=lambda path: types.SimpleNamespace(name='files/stub'),
+            delete_file=lambda name: None
+        )
+        self._model = StubModel(seed, latency_ms, chunks)
+
+    def is_available(self):
+        return True
+
+    def reset(self):
+        pass
+
+
+def install_stubs(data_dir, upload_dir, seed, latency_ms=0, chunks=1):
+    """Point the app at the synthetic corpus and replace the Gemini client"""
+    edunote.NOTES_DATA_FILE = os.path.join(data_dir, 'notes.json')
+    edunote.SUBJECTS_DATA_FILE = os.path.join(data_dir, 'subjects.json')
+    edunote.INDICES_DATA_FILE = os.path.join(data_dir, 'indices.json')
+    edunote._provider = StubGeminiProvider(seed, latency_ms, chunks)
+
+    return edunote.create_app({'UPLOAD_FOLDER': upload_dir, 'INDEX_UPLOAD_FOLDER': os.path.join(upload_dir, 'indices')})
+
+
+def run(args):
+    logging.getLogger('edunote').setLevel(logging.WARNING)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'data')
+        upload_dir = os.path.join(tmp, 'uploads')
+        os.makedirs(data_dir)
+        os.makedirs(upload_dir)
+
+        corpus = build_corpus(data_dir, args.notes, args.index_entries, args.content_chars, args.seed)
+        client = install_stubs(data_dir, upload_dir, args.seed, args.model_latency_ms, args.stream_chunks).test_client()
+        rng = random.Random(args.seed)
+        n = args.iterations
+
+        def get(url):
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        class_url = f'/class/{SUBJECT}/{CLASS_NAME}'
+        results['GET /class'] = measure(lambda: get(class_url), n)
+        results['GET /final-note'] = measure(lambda: get(f'/final-note/{SUBJECT}/{CLASS_NAME}'), n)
+        results['GET /index'] = measure(lambda: get(f'{class_url.replace("/class", "/index")}/{corpus["busiest_index"]}'), n)
+        results['GET /api/note/<id>'] = measure(lambda: get(f'/api/note/{rng.randint(1, corpus["max_id"])}'), n)
+        results['GET /api/note-counts'] = measure(lambda: get('/api/note-counts'), n)
+        results['GET /api/note-counts/<s>/<c>'] = measure(lambda: get(f'/api/note-counts/{SUBJECT}/{CLASS_NAME}'), n)
+
+        # Helpers the upload path depends on
+        notes = edunote.load_data(edunote.NOTES_DATA_FILE, {})
+        sample_note = notes[SUBJECT][CLASS_NAME][corpus['busiest_index']][0]
+        results['load_data(notes)'] = measure(lambda: edunote.load_data(edunote.NOTES_DATA_FILE, {}), n)
+        results['clean_ai_analysis'] = measure(lambda: edunote.clean_ai_analysis(make_analysis(rng)), n * 10)
+        results['match_note_to_index'] = measure(
+            lambda: edunote.match_note_to_index(sample_note['content'], SUBJECT, CLASS_NAME), n)
+        results['local analyze_text'] = measure(
+            lambda: edunote._local_provider.analyze_text(sample_note['content'], SUBJECT, CLASS_NAME), n)
+        del notes
+
+        def upload_form():
+            return {
+                'subject': SUBJECT,
+                'class_name': CLASS_NAME,
+                'file': (io.BytesIO(sample_note['content'].encode('utf-8')), 'bench_note.txt')
+            }
+
+        def upload():
+            response = client.post('/upload', data=upload_form())
+            assert response.status_code == 200, response.status_code
+
+        first_content = []
+
+        def upload_stream():
+            response = client.post('/upload/stream', data=upload_form())
+            assert response.status_code == 200, response.status_code
+            done = response.get_data(as_text=True).rsplit('event: done\ndata: ', 1)[1]
+            first_content.append(json.loads(done)['first_content_ms'])
+
+        results['POST /upload'] = measure(upload, args.upload_iterations)
+        results['POST /upload/stream'] = measure(upload_stream, args.upload_iterations)
+        # Server-reported time until the first analysis field was sent, without the warmup call
+        results['  first content'] = summarize(first_content[1:], results['POST /upload/stream']['ops_per_sec'])
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1000, help='notes in the synthetic class (1k-100k)')
+    parser.add_argument('--index-entries', type=int, default=500, help='lines in the textbook index')
+    parser.add_argument('--content-chars', type=int, default=2000, help='approximate size of each note body')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--upload-iterations', type=int, default=5)
+    parser.add_argument('--model-latency-ms', type=float, default=500, help='time the stub model takes to respond')
+    parser.add_argument('--stream-chunks', type=int, default=10, help='chunks in a streamed stub response')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH', help='baseline file to compare against')
+    args = parser.parse_args()
+
+    params = {key: value for key, value in vars(args).items() if key not in ('save_baseline', 'compare')}
+    baseline = load_baseline(args.compare) if args.compare else None
+    if baseline and baseline.get('params') != params:
+        print(f"warning: baseline was recorded with different parameters: {baseline.get('params')}")
+
+    print(f"notes={args.notes} index_entries={args.index_entries} iterations={args.iterations}")
+    results = run(args)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, params)
+        print(f"baseline saved to {args.save_baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark concurrent downloads from /api/file
+
+Starts the app on a local threaded server with a synthetic upload and
+measures full downloads, range requests (as a PDF viewer issues them) and
+conditional revalidation against the ETag.
+
+    python benchmarks/bench_file_serving.py --size-mb 2 --concurrency 8 --requests 64
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import percentile
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app
+
+FILENAME = '20250101_000000_benchmark.pdf'
+RANGE_CHUNK = 64 * 1024
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def fetch(url, headers=None):
+    """Fetch url, returning (status, bytes received, seconds)"""
+    started = time.perf_counter()
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = b''
+        status = e.code
+    return status, len(body), time.perf_counter() - started
+
+
+def run_case(name, url, headers_for, total, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: fetch(url, headers_for(i)), range(total)))
+    wall = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for _, _, seconds in results]
+    received = sum(size for _, size, _ in results)
+    statuses = sorted({status for status, _, _ in results})
+    print(f"{name:<14} status={statuses} req/s={total / wall:8.1f} "
+          f"MB/s={received / wall / 1024 / 1024:8.1f} "
+          f"p50={statistics.median(latencies):7.1f}ms p99={percentile(latencies, 99):7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as upload_folder:
+        size = int(args.size_mb * 1024 * 1024)
+        with open(os.path.join(upload_folder, FILENAME), 'wb') as f:
+            f.write(os.urandom(size))
+        app = create_app({'UPLOAD_FOLDER': upload_folder})
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f'http://127.0.0.1:{server.server_port}/api/file/{FILENAME}'
+
+        try:
+            with urllib.request.urlopen(url) as response:
+                etag = response.headers['ETag']
+                print(f"file={size / 1024 / 1024:.1f}MB concurrency={args.concurrency} "
+                      f"requests={args.requests} cache-control='{response.headers['Cache-Control']}'")
+
+            chunks = max(1, size // RANGE_CHUNK)
+            run_case('full', url, lambda i: {}, args.requests, args.concurrency)
+            run_case('range-64k', url,
+                     lambda i: {'Range': f'bytes={(i % chunks) * RANGE_CHUNK}-{(i % chunks + 1) * RANGE_CHUNK - 1}'},
+                     args.requests, args.concurrency)
+            run_case('revalidate', url, lambda i: {'If-None-Match': etag}, args.requests, args.concurrency)
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Import-time report and budget for web-worker and CLI cold start
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters,
+reports the cumulative import time and the slowest modules, and exits
+non-zero if the median exceeds the budget or a module that should be
+deferred (e.g. google.generativeai) was imported.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --module app --budget-ms 300 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from harness import REPO_ROOT
+
+# Heavy integrations that must only load on first use
+DEFERRED_MODULES = ['google.generativeai', 'grpc']
+
+
+def import_profile(module):
+    """Return {module: (self_us, cumulative_us)} for one cold import"""
+    env = dict(os.environ, LOG_LEVEL='WARNING', PYTHONWARNINGS='ignore')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='wsgi', help='module to import (wsgi, app, ...)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest modules to list')
+    parser.add_argument('--budget-ms', type=float, default=400)
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    totals = [profile[args.module][1] / 1000 for profile in profiles]
+    median_total = statistics.median(totals)
+
+    print(f"import {args.module}: p50={median_total:.1f}ms min={min(totals):.1f}ms "
+          f"budget={args.budget_ms:.0f}ms ({args.runs} runs)")
+
+    last = profiles[-1]
+    print(f"\n{'module':<48} {'self ms':>9} {'cumulative ms':>14}")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"{name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+    failed = False
+    loaded = [name for name in DEFERRED_MODULES if name in last]
+    if loaded:
+        print(f"\nFAIL: deferred modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+    if median_total > args.budget_ms:
+        print(f"\nFAIL: import time {median_total:.1f}ms exceeds budget {args.budget_ms:.0f}ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Measure cold start time and memory per worker
+
+Times `import wsgi` in fresh interpreters, then (if gunicorn is installed)
+starts gunicorn with the repo's gunicorn.conf.py and reports each worker's
+RSS and PSS, time until the first request is served and how long a
+graceful SIGTERM shutdown takes.
+
+    python benchmarks/bench_startup.py --runs 5 --workers 4
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from harness import REPO_ROOT
+
+IMPORT_SNIPPET = '''
+import resource, time
+started = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - started
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+
+def measure_import(runs):
+    times = []
+    rss = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=REPO_ROOT, env=quiet_env(),
+                                capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]) * 1000)
+        rss.append(int(output[1]) / 1024)
+    print(f"import wsgi     p50={statistics.median(times):7.1f}ms  min={min(times):7.1f}ms  "
+          f"peak RSS={statistics.median(rss):6.1f}MB  ({runs} runs)")
+
+
+def quiet_env():
+    env = dict(os.environ, LOG_LEVEL='WARNING', PYTHONWARNINGS='ignore')
+    return env
+
+
+def memory_kb(pid, field):
+    """Read a field (e.g. Rss, Pss) from /proc/<pid>/smaps_rollup"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure_gunicorn(workers, threads):
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn not installed; skipping per-worker measurements")
+        return
+
+    port = free_port()
+    env = dict(quiet_env(), WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+               BIND=f'127.0.0.1:{port}')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app',
+                               '--access-logfile', '/dev/null'],
+                              cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}/api/note-counts'
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=1).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.perf_counter() - started > 30:
+                    print("gunicorn did not start")
+                    return
+                time.sleep(0.05)
+        first_request = time.perf_counter() - started
+
+        # Wait for every worker to come up before reading memory
+        deadline = time.perf_counter() + 10
+        while len(child_pids(server.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.1)
+
+        print(f"gunicorn        workers={workers} threads={threads} first request after {first_request * 1000:.0f}ms")
+        print(f"  master pid={server.pid} RSS={(memory_kb(server.pid, 'Rss') or 0) / 1024:6.1f}MB")
+        for pid in child_pids(server.pid):
+            rss = memory_kb(pid, 'Rss')
+            pss = memory_kb(pid, 'Pss')
+            if rss is None:
+                continue
+            print(f"  worker pid={pid} RSS={rss / 1024:6.1f}MB PSS={(pss or 0) / 1024:6.1f}MB")
+    finally:
+        stopping = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=120)
+        print(f"  graceful shutdown took {(time.perf_counter() - stopping) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    measure_import(args.runs)
+    measure_gunicorn(args.workers, args.threads)
+
+
+if __name__ == '__main__':
+    main()
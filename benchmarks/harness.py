@@ -0,0 +1,110 @@
+"""Shared helpers for the benchmark scripts"""
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB
+
+    This only ever grows, so it describes the whole run rather than one case.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def measure(func, iterations, warmup=1):
+    """Call func repeatedly and summarize its latency in ms
+
+    rss_growth_mb is how far the current RSS rose above its level before
+    the case, sampled after every call, so it is specific to this case.
+    """
+    rss_before = current_rss_mb()
+    rss_highest = rss_before
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    started = time.perf_counter()
+    sampling = 0.0
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        call_finished = time.perf_counter()
+        latencies.append((call_finished - call_started) * 1000)
+        if rss_before is not None:
+            rss_highest = max(rss_highest, current_rss_mb())
+            sampling += time.perf_counter() - call_finished
+    wall = time.perf_counter() - started - sampling
+
+    rss_growth = rss_highest - rss_before if rss_before is not None else None
+    return summarize(latencies, iterations / wall if wall else None, rss_growth)
+
+
+def summarize(latencies, ops_per_sec, rss_growth_mb=None):
+    """Summarize latencies in ms collected elsewhere, e.g. times reported by the server"""
+    return {
+        'iterations': len(latencies),
+        'ops_per_sec': ops_per_sec,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': percentile(latencies, 99),
+        'rss_growth_mb': rss_growth_mb
+    }
+
+
+def print_results(results, baseline=None):
+    """Print a results table, with the change against a baseline when given"""
+    print(f"{'case':<32} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'+rss MB':>8}  vs baseline p50")
+    for name, result in results.items():
+        growth = result.get('rss_growth_mb')
+        line = (f"{name:<32} {result['ops_per_sec']:>10.1f} {result['p50_ms']:>10.2f} "
+                f"{result['p99_ms']:>10.2f} {'-' if growth is None else f'{growth:.1f}':>8}")
+        if baseline and name in baseline.get('results', {}):
+            before = baseline['results'][name]['p50_ms']
+            if before:
+                line += f"  {(result['p50_ms'] - before) / before * 100:+.1f}%"
+        print(line)
+    print(f"peak RSS of the run: {peak_rss_mb():.1f} MB")
+
+
+def save_baseline(path, results, params):
+    """Save results so later runs can be compared against them"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'params': params,
+            'python': sys.version.split()[0],
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'peak_rss_mb': peak_rss_mb(),
+            'results': results
+        }, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,63 @@
+"""Gunicorn settings for running EduNote with several workers
+
+The app is preloaded in the master so workers share its memory; the Gemini
+client is created lazily in each worker after fork (see
+analysis_providers.GeminiProvider).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+
+# Processes x threads; AI analysis is I/O bound so threads go a long way.
+# Writes to the JSON data files are serialized across workers by app.data_lock().
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+preload_app = True
+
+# Gemini analysis can take 30s+; give in-flight uploads time to finish
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 90))
+
+accesslog = '-'
+
+# Each worker keeps its own metrics; snapshots in this directory let any
+# worker answer /metrics for all of them
+os.environ.setdefault('METRICS_DIR', os.path.join('data', 'metrics'))
+
+
+def on_starting(server):
+    """Start metrics from zero on each server start"""
+    import metrics
+    metrics.clear_snapshots(os.environ['METRICS_DIR'])
+
+
+def post_worker_init(worker):
+    """Refuse new uploads with 503 as soon as the worker is asked to stop
+
+    Gunicorn's own SIGTERM handler only stops the accept loop; requests
+    already queued on the worker would otherwise start new analyses that
+    the graceful timeout may cut short.
+    """
+    import signal
+    import app
+
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def begin_draining(signum, frame):
+        app.begin_draining()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, begin_draining)
+
+
+def worker_exit(server, worker):
+    """Graceful stop (SIGTERM): wait for analyses still running
+
+    Gunicorn has already waited for open connections; this also covers
+    analyses whose request thread outlived them.
+    """
+    import app
+    app.drain_analysis_jobs(timeout=graceful_timeout)
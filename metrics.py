@@ -0,0 +1,235 @@
+"""In-process metrics registry with Prometheus text output
+
+Each process keeps its own registry. When several worker processes serve
+the app (see gunicorn.conf.py), configure() a shared directory: every
+process then writes a snapshot of its registry there every few seconds
+and at exit, and render_prometheus() merges all snapshots, so any worker
+can answer a scrape. Counters and histograms are summed across processes,
+including ones that have exited; gauges take the most recently written
+value.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {}
+
+# Multiprocess mode: directory for per-process snapshots and the flush period
+_snapshot_dir = None
+_flush_interval = 5.0
+_flusher_pid = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def describe(name, help_text):
+    """Register the HELP text shown for a metric"""
+    _help[name] = help_text
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    """Time the enclosed block into a histogram, in seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def stage_timer(stage):
+    """Time one stage of the upload pipeline"""
+    return timed('edunote_upload_stage_seconds', stage=stage)
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ''
+    escaped = []
+    for name, value in items:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _header(lines, seen, name, metric_type):
+    if name in seen:
+        return
+    seen.add(name)
+    if name in _help:
+        lines.append(f'# HELP {name} {_help[name]}')
+    lines.append(f'# TYPE {name} {metric_type}')
+
+
+def configure(directory=None, flush_interval=5.0):
+    """Share metrics between worker processes through snapshot files in directory"""
+    global _snapshot_dir, _flush_interval
+    _snapshot_dir = directory
+    _flush_interval = flush_interval
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        _start_flusher()
+
+
+def clear_snapshots(directory):
+    """Remove the snapshots of a previous server run, if any"""
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        os.remove(path)
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+            'gauges': [[name, labels, value] for (name, labels), value in _gauges.items()],
+            'histograms': [[name, labels, dict(histogram, buckets=list(histogram['buckets']))]
+                           for (name, labels), histogram in _histograms.items()]
+        }
+
+
+def flush():
+    """Write this process's snapshot for the other processes to read"""
+    if not _snapshot_dir:
+        return
+    path = os.path.join(_snapshot_dir, f'metrics_{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(_flush_interval)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _start_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True).start()
+
+
+def _after_fork():
+    # A forked worker starts with an empty registry and its own flusher
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
+    if _snapshot_dir:
+        _start_flusher()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
+
+
+def _merged():
+    """Return (counters, gauges, histograms) for this process, or for all processes in multiprocess mode"""
+    if not _snapshot_dir:
+        with _lock:
+            return (dict(_counters), dict(_gauges),
+                    {key: dict(value, buckets=list(value['buckets'])) for key, value in _histograms.items()})
+
+    flush()
+    counters = {}
+    gauges = {}
+    histograms = {}
+    paths = sorted(glob.glob(os.path.join(_snapshot_dir, 'metrics_*.json')), key=os.path.getmtime)
+    for path in paths:
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            gauges[(name, tuple(tuple(label) for label in labels))] = value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, gauges, histograms
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = []
+    seen = set()
+    counters, gauges, histograms = _merged()
+
+    for (name, labels), value in sorted(counters.items()):
+        _header(lines, seen, name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), value in sorted(gauges.items()):
+        _header(lines, seen, name, 'gauge')
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        _header(lines, seen, name, 'histogram')
+        for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear all recorded metrics"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
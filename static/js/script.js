@@ -32,12 +32,39 @@ function showUploadModal(subject = '', className = '', indexKey = '') {
 function closeUploadModal() {
     document.getElementById('uploadModal').style.display = 'none';
     document.getElementById('uploadForm').reset();
+    
+    const progress = document.getElementById('uploadProgress');
+    if (progress) {
+        progress.innerHTML = '';
+        progress.style.display = 'none';
+    }
+}
+
+// Subject and class names for the dropdowns, fetched once and refreshed
+// whenever a subject or class is created
+const SUBJECT_DROPDOWN_FIELDS = 'classes.*.name';
+let subjectsCache = null;
+
+function fetchSubjects() {
+    if (!subjectsCache) {
+        subjectsCache = fetch(`/api/subjects?fields=${SUBJECT_DROPDOWN_FIELDS}`)
+            .then(response => response.json())
+            .catch(error => {
+                subjectsCache = null;
+                throw error;
+            });
+    }
+    return subjectsCache;
+}
+
+function invalidateSubjectsCache() {
+    subjectsCache = null;
+    loadSubjectsAndClasses();
 }
 
 // Load subjects and classes for dropdowns
 function loadSubjectsAndClasses() {
-    fetch('/api/subjects')
-        .then(response => response.json())
+    fetchSubjects()
         .then(data => {
             populateSubjectDropdown(data);
         })
@@ -84,8 +111,7 @@ function onSubjectChange() {
         classSelect.disabled = false;
         
         // Load classes for selected subject
-        fetch('/api/subjects')
-            .then(response => response.json())
+        fetchSubjects()
             .then(data => {
                 if (data[selectedSubject] && data[selectedSubject].classes) {
                     for (const [className, classData] of Object.entries(data[selectedSubject].classes)) {
@@ -199,16 +225,9 @@ document.addEventListener('DOMContentLoaded', function() {
             submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Uploading...';
             submitBtn.disabled = true;
             
-            fetch('/upload', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                return response.json();
-            })
+            resetUploadProgress();
+            
+            uploadWithStreaming(formData)
             .then(data => {
                 if (data.success) {
                     // Show success message
@@ -238,6 +257,145 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Streaming upload: relays analysis fields to the modal as Gemini generates them
+function uploadWithStreaming(formData) {
+    return fetch('/upload/stream', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.json()
+                .catch(() => ({}))
+                .then(data => {
+                    throw new Error(data.error || `HTTP error! status: ${response.status}`);
+                });
+        }
+        
+        // Fall back to reading the whole body if the browser cannot stream it
+        if (!response.body || !response.body.getReader) {
+            return response.text().then(text => handleUploadEvents(text).result);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (value) {
+                    buffer += decoder.decode(value, { stream: true });
+                }
+                const parsed = handleUploadEvents(buffer);
+                buffer = parsed.rest;
+                if (parsed.result) {
+                    return parsed.result;
+                }
+                if (done) {
+                    throw new Error('Upload stream ended unexpectedly');
+                }
+                return read();
+            });
+        }
+        
+        return read();
+    });
+}
+
+function handleUploadEvents(buffer) {
+    // Events are separated by a blank line; the last chunk may be incomplete
+    const blocks = buffer.split('\n\n');
+    const rest = blocks.pop();
+    let result = null;
+    
+    for (const block of blocks) {
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) {
+                event = line.slice(7);
+            } else if (line.startsWith('data: ')) {
+                data += line.slice(6);
+            }
+        });
+        if (!data) {
+            continue;
+        }
+        
+        const payload = JSON.parse(data);
+        if (event === 'stage') {
+            showUploadStage(payload.stage);
+        } else if (event === 'partial') {
+            renderUploadPartial(payload);
+        } else if (event === 'done') {
+            // Show the analysis as stored, which may differ from what was streamed
+            if (payload.analysis) {
+                uploadAnalysis = {};
+                renderUploadPartial(payload.analysis);
+            }
+            result = payload;
+        }
+    }
+    
+    return { result, rest };
+}
+
+// Analysis fields received so far for the upload in progress
+let uploadAnalysis = {};
+
+function resetUploadProgress() {
+    uploadAnalysis = {};
+    const progress = document.getElementById('uploadProgress');
+    if (progress) {
+        progress.innerHTML = '<p class="upload-stage"><i class="fas fa-spinner fa-spin"></i> <span>Uploading file...</span></p>' +
+                             '<div class="upload-analysis"></div>';
+        progress.style.display = 'block';
+    }
+}
+
+function showUploadStage(stage) {
+    const label = document.querySelector('#uploadProgress .upload-stage span');
+    if (!label) {
+        return;
+    }
+    const messages = {
+        saved: 'Sending file to AI...',
+        analyzing: 'Analyzing note...'
+    };
+    label.textContent = messages[stage] || stage;
+}
+
+function renderUploadPartial(fields) {
+    const container = document.querySelector('#uploadProgress .upload-analysis');
+    if (!container) {
+        return;
+    }
+    Object.assign(uploadAnalysis, fields);
+    
+    const sections = [
+        ['key_topics', 'fas fa-tags', 'Key Topics'],
+        ['important_equations', 'fas fa-calculator', 'Important Equations'],
+        ['important_points', 'fas fa-star', 'Important Points'],
+        ['test_questions', 'fas fa-question-circle', 'Test Questions']
+    ];
+    
+    let html = '';
+    for (const [field, icon, heading] of sections) {
+        const value = uploadAnalysis[field];
+        const items = Array.isArray(value) ? value : (value ? [value] : []);
+        if (items.length === 0) {
+            continue;
+        }
+        html += `<h4><i class="${icon}"></i> ${heading}</h4><ul>`;
+        items.forEach(item => {
+            const text = item && typeof item === 'object' ? item.text : item;
+            html += `<li>${escapeHtml(String(text || ''))}</li>`;
+        });
+        html += '</ul>';
+    }
+    container.innerHTML = html;
+}
+
 // Note Actions
 function starNote(noteId) {
     // TODO: Implement starring functionality
@@ -255,8 +413,10 @@ function questionNote(noteId) {
 }
 
 // View Note Details
+const NOTE_MODAL_FIELDS = 'original_name,content,ai_analysis';
+
 function viewNote(noteId) {
-    fetch(`/api/note/${noteId}`)
+    fetch(`/api/note/${noteId}?fields=${NOTE_MODAL_FIELDS}`)
         .then(response => response.json())
         .then(note => {
             displayNoteModal(note);
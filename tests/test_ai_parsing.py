@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from ai_parsing import AIResponseParseError, _repair_json, parse_ai_response, parse_partial_response
+
+
+def test_valid_response_is_validated():
+    analysis = parse_ai_response('{"key_topics": "Limits", "important_points": ["a point"]}')
+    assert analysis['key_topics'] == ['Limits']
+    assert analysis['important_points'] == [{'text': 'a point', 'explanation': '', 'type': ''}]
+
+
+def test_code_fences_are_stripped():
+    analysis = parse_ai_response('Here you go:\n```json\n{"key_topics": ["Series"]}\n```')
+    assert analysis['key_topics'] == ['Series']
+
+
+def test_trailing_commas_are_removed():
+    assert json.loads(_repair_json('{"a": [1, 2,], "b": 3,}')) == {'a': [1, 2], 'b': 3}
+
+
+def test_curly_quotes_inside_strings_are_kept():
+    analysis = parse_ai_response('{"key_topics":["the “chain” rule",],}')
+    assert analysis['key_topics'] == ['the “chain” rule']
+
+
+def test_curly_quotes_as_delimiters_are_replaced():
+    assert json.loads(_repair_json('{“key_topics”: [“Limits”]}')) == {'key_topics': ['Limits']}
+
+
+def test_python_literals_are_replaced_outside_strings_only():
+    analysis = parse_ai_response('{"subject_match": True, "test_questions": ["True or False: x",], "index_relevance": None}')
+    assert analysis['subject_match'] is True
+    assert analysis['test_questions'] == ['True or False: x']
+    assert analysis['index_relevance'] == ''
+
+
+def test_escaped_quotes_do_not_end_strings():
+    assert json.loads(_repair_json('{"a": "say \\"True\\", then,", "b": [1,]}')) == {'a': 'say "True", then,', 'b': [1]}
+
+
+def test_truncated_response_is_closed():
+    analysis = parse_ai_response('{"key_topics": ["Limits", "Continu')
+    assert analysis['key_topics'] == ['Limits', 'Continu']
+
+
+def test_truncated_after_comma_is_closed():
+    assert json.loads(_repair_json('{"a": [1, 2, ')) == {'a': [1, 2]}
+
+
+def test_top_level_array_is_rejected():
+    with pytest.raises(AIResponseParseError):
+        parse_ai_response('[{"key_topics": ["Limits"]}]')
+    with pytest.raises(AIResponseParseError):
+        parse_ai_response('[{"key_topics": ["Limits"]},')
+
+
+def test_response_without_object_is_rejected():
+    with pytest.raises(AIResponseParseError):
+        parse_ai_response('Sorry, I cannot analyze this file.')
+
+
+def test_partial_response_returns_complete_fields():
+    fields, _ = parse_partial_response('{"key_topics": ["Limits"], "highlights": ["half')
+    assert fields == {'key_topics': ['Limits']}
+
+
+def test_partial_response_resumes_after_complete_fields():
+    text = '```json\n{"key_topics": ["Limits"], "highlights": ["half'
+    fields, pos = parse_partial_response(text)
+    assert fields == {'key_topics': ['Limits']}
+    text += ' way"], "test_questions": [], "index_relevance": "Ch'
+    fields, pos = parse_partial_response(text, pos)
+    assert fields == {'highlights': ['half way'], 'test_questions': []}
+    fields, _ = parse_partial_response(text + '1"}\n```', pos)
+    assert fields == {'index_relevance': 'Ch1'}
+
+
+def test_partial_number_at_end_is_not_returned():
+    fields, pos = parse_partial_response('{"a": 12')
+    assert fields == {}
+    assert parse_partial_response('{"a": 123, ', pos)[0] == {'a': 123}
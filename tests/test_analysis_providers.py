@@ -0,0 +1,29 @@
+import pytest
+
+from analysis_providers import AnalysisProvider, GeminiProvider, LocalProvider
+
+
+class TextOnlyProvider(AnalysisProvider):
+    name = 'text-only'
+
+    def analyze_text(self, content, subject, class_name, index_key=None):
+        return {}
+
+
+def test_provider_missing_a_method_cannot_be_created():
+    with pytest.raises(TypeError, match='analyze_file'):
+        TextOnlyProvider()
+
+
+def test_shipped_providers_implement_the_interface():
+    assert isinstance(GeminiProvider(), AnalysisProvider)
+    assert isinstance(LocalProvider(), AnalysisProvider)
+
+
+def test_stream_file_defaults_to_one_done_event():
+    class FixedProvider(TextOnlyProvider):
+        def analyze_file(self, filepath, subject, class_name, index_key=None, content=None):
+            return {'key_topics': [content]}
+
+    events = list(FixedProvider().stream_file('note.txt', 'Math', 'Math292', content='Limits'))
+    assert events == [('done', {'key_topics': ['Limits']})]
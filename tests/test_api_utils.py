@@ -0,0 +1,91 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify, request
+
+from api_utils import compress_response, parse_fields, project_fields
+
+SUBJECT = {
+    'description': 'Calculus courses',
+    'classes': {
+        'Math292': {'name': 'Math292', 'note_count': 3, 'indices': {'1.1': 'Limits'}},
+        'Math293': {'note_count': 0}
+    }
+}
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields('') is None
+    assert parse_fields('id, classes.*.name,') == [['id'], ['classes', '*', 'name']]
+
+
+def test_no_fields_returns_data_unchanged():
+    assert project_fields(SUBJECT, None) is SUBJECT
+
+
+def test_dotted_paths_are_merged():
+    projected = project_fields(SUBJECT, parse_fields('description,classes.Math292.name,classes.Math292.note_count'))
+    assert projected == {'description': 'Calculus courses', 'classes': {'Math292': {'name': 'Math292', 'note_count': 3}}}
+
+
+def test_wildcard_keeps_every_key():
+    projected = project_fields(SUBJECT, parse_fields('classes.*.name'))
+    assert projected == {'classes': {'Math292': {'name': 'Math292'}, 'Math293': {}}}
+
+
+def test_missing_paths_are_dropped():
+    assert project_fields(SUBJECT, parse_fields('missing,description.length,classes.Math299.name')) == {}
+    assert project_fields(SUBJECT, parse_fields('classes.Math293.name,classes.Math293.note_count')) == {
+        'classes': {'Math293': {'note_count': 0}}
+    }
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/large')
+    def large():
+        return jsonify({'notes': [{'id': i, 'content': 'derivative of a composite function'} for i in range(50)]})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'id': 1})
+
+    app.after_request(lambda response: compress_response(response, request))
+    return app.test_client()
+
+
+def test_gzip_and_identity_have_different_etags(client):
+    compressed = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    identity = client.get('/large', headers={'Accept-Encoding': 'identity'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in identity.headers
+    assert compressed.get_etag()[0] == identity.get_etag()[0] + '-gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == identity.get_json()
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+
+
+def test_matching_if_none_match_returns_304(client):
+    etag = client.get('/large', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_etag_of_other_encoding_does_not_match(client):
+    etag = client.get('/large', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get('/large', headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert not response.get_etag()[0].endswith('-gzip')
@@ -0,0 +1,52 @@
+from app import MAX_NOTES_PAGE_SIZE, NOTES_PAGE_SIZE, paginate_notes
+
+NOTES = [{'id': note_id, 'original_name': f'note{note_id}.pdf', 'content': 'text'} for note_id in (7, 3, 12, 5, 9)]
+
+
+def page_ids(page):
+    return [note['id'] for note in page['notes']]
+
+
+def test_first_page_is_ordered_by_id():
+    page = paginate_notes(NOTES, limit=2)
+    assert page_ids(page) == [3, 5]
+    assert page['next_cursor'] == 5
+    assert page['total'] == 5
+
+
+def test_cursor_starts_after_the_cursor_id():
+    assert page_ids(paginate_notes(NOTES, cursor=5, limit=2)) == [7, 9]
+    # The cursor need not be the id of a stored note
+    assert page_ids(paginate_notes(NOTES, cursor=6, limit=2)) == [7, 9]
+
+
+def test_last_page_has_no_next_cursor():
+    page = paginate_notes(NOTES, cursor=7, limit=2)
+    assert page_ids(page) == [9, 12]
+    assert page['next_cursor'] is None
+    assert paginate_notes(NOTES, cursor=12)['notes'] == []
+
+
+def test_pages_cover_every_note_once():
+    seen = []
+    cursor = None
+    while True:
+        page = paginate_notes(NOTES, cursor=cursor, limit=2)
+        seen += page_ids(page)
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [3, 5, 7, 9, 12]
+
+
+def test_limit_is_clamped():
+    notes = [{'id': note_id} for note_id in range(1, MAX_NOTES_PAGE_SIZE + 10)]
+    assert len(paginate_notes(notes)['notes']) == NOTES_PAGE_SIZE
+    assert len(paginate_notes(notes, limit=1000)['notes']) == MAX_NOTES_PAGE_SIZE
+    assert len(paginate_notes(notes, limit=-5)['notes']) == 1
+
+
+def test_summaries_leave_out_content():
+    note = paginate_notes(NOTES, limit=1)['notes'][0]
+    assert 'content' not in note
+    assert set(note['ai_analysis']) == {'important_points', 'test_questions', 'important_equations'}